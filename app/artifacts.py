@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from flask import current_app
+
+# Managed on-disk store for uploaded workbooks and generated PDFs. Files are
+# named by the SHA-256 of their content (or, for derived files, of their
+# source), so repeated uploads share one file. Every access bumps the file's
+# mtime, which doubles as the LRU clock: the sweeper removes files unused
+# for ARTIFACT_TTL_SECONDS, then the least recently used ones until the
+# store fits in ARTIFACT_MAX_BYTES.
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_SWEEP_SECONDS = 600
+# Files this new are never evicted for space (a conversion may be reading them)
+MIN_AGE_SECONDS = 60
+
+# <sha256>.<ext>, or <sha256>-<suffix>.<ext> for files derived from that artifact
+NAME_PATTERN = re.compile(r"^[0-9a-f]{64}(-[a-z0-9]+)?\.[a-z0-9]+$")
+TEMP_PREFIX = ".tmp-"
+
+_sweeper_started = False
+
+
+def artifact_dir():
+    directory = current_app.config.get("ARTIFACT_DIR") or os.path.join(os.getcwd(), "uploads")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def artifact_name(digest, extension):
+    return f"{digest}.{extension.lower().lstrip('.')}"
+
+
+def derived_name(name, suffix, extension):
+    """Name of a file derived from artifact ``name`` (e.g. page 3 of a PDF: suffix "p3")"""
+    return f"{name.rsplit('.', 1)[0]}-{suffix}.{extension.lower().lstrip('.')}"
+
+
+def artifact_path(name, touch=True):
+    """Path of a stored artifact, or None if the name is invalid or missing.
+
+    ``touch`` marks the artifact as recently used.
+    """
+    if not NAME_PATTERN.match(name or ""):
+        return None
+    path = os.path.join(artifact_dir(), name)
+    try:
+        if touch:
+            os.utime(path)
+        elif not os.path.exists(path):
+            return None
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def temp_path(extension):
+    """A fresh temporary path inside the store, for writers that need a file name"""
+    fd, path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=f".{extension}", dir=artifact_dir())
+    os.close(fd)
+    return path
+
+
+def store_stream(stream, extension, chunk_size=1024 * 1024):
+    """Copy a file-like object into the store; return (name, size).
+
+    The content is hashed while it is written to a temporary file, which is
+    then renamed to its content address. If the same content is already
+    stored, the copy is discarded and the existing file reused.
+    """
+    digest = hashlib.sha256()
+    path = temp_path(extension)
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        name = artifact_name(digest.hexdigest(), extension)
+        _commit(path, name)
+    except BaseException:
+        _remove(path)
+        raise
+    enforce_budget()
+    return name, size
+
+
+def store_file(path, name):
+    """Move a finished file (e.g. a temp_path) into the store as ``name``"""
+    _commit(path, name)
+    enforce_budget()
+    return name
+
+
+def _commit(path, name):
+    final = os.path.join(artifact_dir(), name)
+    if os.path.exists(final):
+        _remove(path)
+        os.utime(final)
+    else:
+        os.replace(path, final)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_artifact(name):
+    path = artifact_path(name, touch=False)
+    if path:
+        _remove(path)
+
+
+def sweep(max_bytes=None, ttl_seconds=None, now=None):
+    """Apply TTL and then LRU eviction to the store; return (removed, bytes_left)"""
+    config = current_app.config
+    max_bytes = max_bytes if max_bytes is not None else config.get("ARTIFACT_MAX_BYTES", DEFAULT_MAX_BYTES)
+    ttl_seconds = ttl_seconds if ttl_seconds is not None else config.get("ARTIFACT_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+    now = now or time.time()
+
+    entries = []
+    removed = 0
+    with os.scandir(artifact_dir()) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            stored = NAME_PATTERN.match(entry.name)
+            # Expired artifacts, and temp files left behind by crashed writers
+            if ttl_seconds and now - stat.st_mtime > ttl_seconds and (stored or entry.name.startswith(TEMP_PREFIX)):
+                _remove(entry.path)
+                removed += 1
+            elif stored:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if now - mtime < MIN_AGE_SECONDS:
+            continue
+        _remove(path)
+        removed += 1
+        total -= size
+    return removed, total
+
+
+def enforce_budget():
+    """Evict least recently used artifacts if the store is over budget"""
+    try:
+        sweep(ttl_seconds=0)
+    except OSError as e:
+        print("Artifact sweep failed:", e)
+
+
+def start_sweeper(app):
+    """Start the background thread that sweeps the store periodically"""
+    global _sweeper_started
+    if _sweeper_started:
+        return
+    _sweeper_started = True
+    interval = app.config.get("ARTIFACT_SWEEP_SECONDS", DEFAULT_SWEEP_SECONDS)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    removed, total = sweep()
+                if removed:
+                    print(f"Artifact sweep: removed {removed} files, {total} bytes in use")
+            except Exception as e:
+                print("Artifact sweep failed:", e)
+
+    threading.Thread(target=run, name="artifact-sweeper", daemon=True).start()
@@ -0,0 +1,232 @@
+from sqlalchemy import bindparam, select, tuple_
+from .models import db, MODEL_MAP
+from .schemas import SHEETS, NATURAL_KEYS
+from .coercion import coerce_data
+from .stats import adjust_row_counts
+
+# Rows per IN (...) list / executemany batch
+BATCH_CHUNK_SIZE = 1000
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _clean_row(sheet_name, row, allow_id=False):
+    """Validate one JSON row object; return (data, errors).
+
+    Values are stripped like form input ('' becomes None), unknown columns
+    are rejected and typed columns are coerced with coerce_data.
+    """
+    if not isinstance(row, dict):
+        return None, [{'column': None, 'value': row, 'message': "Row must be an object"}]
+
+    data = {}
+    errors = []
+    for col, value in row.items():
+        if col == 'id' and allow_id:
+            continue
+        if col not in SHEETS[sheet_name]:
+            errors.append({'column': col, 'value': value, 'message': f"Unknown column for {sheet_name}"})
+            continue
+        if isinstance(value, str):
+            value = value.strip() or None
+        data[col] = value
+    if errors:
+        return None, errors
+
+    data, errors = coerce_data(sheet_name, data)
+    # Text columns keep JSON numbers as their string form
+    table = MODEL_MAP[sheet_name].__table__
+    for col, value in data.items():
+        if value is not None and isinstance(table.c[col].type, db.String) and not isinstance(value, str):
+            data[col] = str(value)
+    return (None if errors else data), errors
+
+
+def _row_id(row):
+    """The integer id of an update/delete entry, or None"""
+    row_id = row.get('id') if isinstance(row, dict) else row
+    if isinstance(row_id, bool) or not isinstance(row_id, int):
+        return None
+    return row_id
+
+
+def _taken_keys(table, key_columns, project_id, keys, exclude_ids):
+    """The ``keys`` already held by rows of the project outside ``exclude_ids``"""
+    columns = [table.c[col] for col in key_columns]
+    if len(columns) == 1:
+        match, values = columns[0], [key[0] for key in keys]
+    else:
+        match, values = tuple_(*columns), keys
+    taken = set()
+    for chunk in _chunks(values, BATCH_CHUNK_SIZE):
+        query = select(table.c.id, *columns).where(table.c.project_id == project_id, match.in_(chunk))
+        for row in db.session.execute(query):
+            if row[0] not in exclude_ids:
+                taken.add(tuple(row[1:]))
+    return taken
+
+
+def _check_natural_keys(sheet_name, project_id, new_rows, changed_rows, update_indexes, delete_ids):
+    """Find inserts and updates that would give two rows the same natural key.
+
+    The unique ux_<table>_natural_key index would reject them at write
+    time; checking first lets them be reported per row. Keys with an empty
+    part are never unique-checked. Returns [(kind, indexes, key, message)].
+    """
+    table = MODEL_MAP[sheet_name].__table__
+    key_columns = NATURAL_KEYS[sheet_name]
+    # Updates may change only part of a key; the rest comes from the stored row
+    current = {}
+    for chunk in _chunks(sorted(changed_rows), BATCH_CHUNK_SIZE):
+        query = select(table.c.id, *[table.c[col] for col in key_columns]).where(table.c.id.in_(chunk))
+        current.update((row[0], tuple(row[1:])) for row in db.session.execute(query))
+
+    claims = [('insert', [index], tuple(data.get(col) for col in key_columns)) for index, data in new_rows]
+    # Deleted rows and rows whose key changes give up their stored key
+    released = set(delete_ids)
+    for row_id, data in changed_rows.items():
+        # Updates that leave the key alone cannot add a conflict
+        if row_id in delete_ids or row_id not in current or not set(key_columns) & set(data):
+            continue
+        released.add(row_id)
+        key = tuple(data.get(col, old) for col, old in zip(key_columns, current[row_id]))
+        claims.append(('update', update_indexes[row_id], key))
+    claims = [claim for claim in claims if None not in claim[2]]
+    if not claims:
+        return []
+
+    taken = _taken_keys(table, key_columns, project_id, list({key for _, _, key in claims}), released)
+    key_name = ", ".join(key_columns)
+    first_claim = {}
+    conflicts = []
+    for kind, indexes, key in claims:
+        if key in taken:
+            message = f"Another row of the project already has this ({key_name})"
+        elif key in first_claim:
+            message = f"Same ({key_name}) as {first_claim[key]} in this batch"
+        else:
+            first_claim[key] = f"{kind} {indexes[0]}"
+            continue
+        conflicts.append((kind, indexes, key, message))
+    return conflicts
+
+
+def apply_row_batch(sheet_name, project_id, inserts=(), updates=(), deletes=(), partial=False):
+    """Apply a batch of inserts, updates and deletes to one sheet of a project.
+
+    ``inserts`` are {column: value} objects, ``updates`` the same plus an
+    ``id``, ``deletes`` row ids (or {'id': ...} objects). Every entry is
+    validated first; unless ``partial`` is set, any invalid entry rejects
+    the whole batch. Inserts and updates that would repeat a natural key of
+    the project, or of another entry in the batch, are invalid too. Valid
+    entries are written with chunked DELETE ... WHERE id IN (...) and
+    executemany UPDATE / INSERT statements, all in one transaction. Returns (applied, results) where results has one entry per
+    input row under 'insert', 'update' and 'delete', each with its 'index',
+    a 'status' and the row 'id' or the validation 'errors'.
+    """
+    model = MODEL_MAP[sheet_name]
+    table = model.__table__
+    results = {'insert': [], 'update': [], 'delete': []}
+
+    new_rows = []
+    for index, row in enumerate(inserts):
+        data, errors = _clean_row(sheet_name, row)
+        if errors:
+            results['insert'].append({'index': index, 'status': 'error', 'errors': errors})
+            continue
+        if not any(value is not None for value in data.values()):
+            results['insert'].append({'index': index, 'status': 'error', 'errors': [
+                {'column': None, 'value': None, 'message': "Row has no values"}]})
+            continue
+        results['insert'].append({'index': index, 'status': 'inserted', 'id': None})
+        new_rows.append((index, data))
+
+    # Update/delete ids must belong to this project
+    requested = {_row_id(row) for row in list(updates) + list(deletes)} - {None}
+    existing = set()
+    for chunk in _chunks(sorted(requested), BATCH_CHUNK_SIZE):
+        existing.update(db.session.execute(
+            select(table.c.id).where(table.c.project_id == project_id, table.c.id.in_(chunk))).scalars())
+
+    changed_rows = {}
+    update_indexes = {}
+    for index, row in enumerate(updates):
+        row_id = _row_id(row) if isinstance(row, dict) else None
+        if row_id is None:
+            data, errors = None, [{'column': 'id', 'value': row, 'message': "Update needs an object with an integer id"}]
+        else:
+            data, errors = _clean_row(sheet_name, row, allow_id=True)
+        if not errors and row_id not in existing:
+            errors = [{'column': 'id', 'value': row_id, 'message': "Row not found"}]
+        if errors:
+            results['update'].append({'index': index, 'status': 'error', 'errors': errors})
+            continue
+        results['update'].append({'index': index, 'status': 'updated', 'id': row_id})
+        # Later updates of the same row win, merged column by column
+        changed_rows.setdefault(row_id, {}).update(data)
+        update_indexes.setdefault(row_id, []).append(index)
+
+    delete_ids = set()
+    for index, row in enumerate(deletes):
+        row_id = _row_id(row)
+        if row_id not in existing:
+            results['delete'].append({'index': index, 'status': 'error', 'errors': [
+                {'column': 'id', 'value': row_id, 'message': "Row not found"}]})
+            continue
+        results['delete'].append({'index': index, 'status': 'deleted', 'id': row_id})
+        delete_ids.add(row_id)
+
+    conflicts = _check_natural_keys(sheet_name, project_id, new_rows, changed_rows, update_indexes, delete_ids)
+    key_name = ", ".join(NATURAL_KEYS[sheet_name])
+    for kind, indexes, key, message in conflicts:
+        for index in indexes:
+            results[kind][index] = {'index': index, 'status': 'error', 'errors': [
+                {'column': key_name, 'value': list(key), 'message': message}]}
+        if kind == 'update':
+            changed_rows.pop(_row_id(updates[indexes[0]]))
+    rejected = {index for kind, indexes, _, _ in conflicts if kind == 'insert' for index in indexes}
+    new_rows = [(index, data) for index, data in new_rows if index not in rejected]
+
+    failed = any(result['status'] == 'error' for entries in results.values() for result in entries)
+    if failed and not partial:
+        for entries in results.values():
+            for result in entries:
+                if result['status'] != 'error':
+                    result['status'] = 'skipped'
+        return False, results
+
+    try:
+        # Deletes and updates first so keys they free can be taken by later rows
+        for chunk in _chunks(sorted(delete_ids), BATCH_CHUNK_SIZE):
+            db.session.execute(table.delete().where(table.c.project_id == project_id, table.c.id.in_(chunk)))
+
+        # Group updates by the set of columns they change, one executemany per group
+        groups = {}
+        for row_id, data in changed_rows.items():
+            if row_id not in delete_ids and data:
+                groups.setdefault(tuple(sorted(data)), []).append(dict(data, _id=row_id))
+        for cols, params in groups.items():
+            update_stmt = (table.update()
+                           .where(table.c.id == bindparam('_id'), table.c.project_id == project_id)
+                           .values({col: bindparam(col) for col in cols}))
+            for chunk in _chunks(params, BATCH_CHUNK_SIZE):
+                db.session.execute(update_stmt, chunk)
+
+        if new_rows:
+            # executemany needs one parameter shape, so every insert gets every column
+            insert_stmt = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+            params = [dict(dict.fromkeys(SHEETS[sheet_name]), **data, project_id=project_id)
+                      for _, data in new_rows]
+            new_ids = db.session.execute(insert_stmt, params).scalars().all()
+            for (index, _), row_id in zip(new_rows, new_ids):
+                results['insert'][index]['id'] = row_id
+
+        adjust_row_counts(project_id, {sheet_name: len(new_rows) - len(delete_ids)})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True, results
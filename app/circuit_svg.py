@@ -0,0 +1,140 @@
+import hashlib
+import importlib.util
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from .models import db, MODEL_MAP
+from .schemas import SHEETS
+from .coercion import format_value
+
+# Single-circuit drawings are rendered in-process with the PDF converter's
+# own drawers (excel_to_pdf_converter.draw_symbols and friends), from rows
+# read straight from the database. Rendered SVGs are cached briefly, keyed
+# on the content of every row that goes into the drawing.
+CONVERTER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "excel_to_pdf_converter.py")
+DEFAULT_CACHE_SECONDS = 300
+CACHE_MAX_ENTRIES = 256
+# Drawing scale; the PDF pages come out at roughly one inch per unit too
+INCHES_PER_UNIT = 1.0
+MARGIN_UNITS = 1.5
+
+# Sheets that feed a circuit drawing, as passed to set_sheet_data
+DRAWING_SHEETS = ("terminal", "junction_box", "terminal_header", "group", "circuit",
+                  "choketable", "resistortable")
+
+_converter = None
+# The converter keeps its sheet data in module globals, so one drawing at a time
+_draw_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def converter():
+    """The converter script, imported once as a module (its drawing code only runs via main())"""
+    global _converter
+    if _converter is None:
+        spec = importlib.util.spec_from_file_location("excel_to_pdf_converter", CONVERTER_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _converter = module
+    return _converter
+
+
+def _sheet_rows(sheet_name, project_id, circuit_ids):
+    """Display-text rows of one sheet for some circuits (as exported to the converter's workbook)"""
+    model = MODEL_MAP[sheet_name]
+    query = (select(*[getattr(model, col) for col in SHEETS[sheet_name]])
+             .where(model.project_id == project_id, model.circuit_id.in_(circuit_ids))
+             .order_by(model.id))
+    return [tuple(format_value(value) for value in row) for row in db.session.execute(query)]
+
+
+def circuit_ids_for(project_id, circuit_id=None, junction_name=None, row=None):
+    """Circuit ids to draw: one circuit, or the circuits of a junction (optionally one ``row``)"""
+    model = MODEL_MAP["circuit"]
+    if circuit_id is not None:
+        return [circuit_id]
+    query = select(model.circuit_id).where(model.project_id == project_id, model.junction_name == junction_name)
+    if row is not None:
+        query = query.where(model.row == row)
+    return list(dict.fromkeys(db.session.execute(query.order_by(model.id)).scalars()))
+
+
+def drawing_rows(project_id, circuit_ids):
+    """{sheet name: rows} for everything drawn for ``circuit_ids``"""
+    # The drawers never read the junction_box sheet
+    return {name: [] if name == "junction_box" else _sheet_rows(name, project_id, circuit_ids)
+            for name in DRAWING_SHEETS}
+
+
+def content_key(circuit_ids, rows, title=""):
+    """Cache key: a hash of the requested circuits, the title and every row drawn for them"""
+    digest = hashlib.sha256(repr((list(circuit_ids), title, sorted(rows.items()))).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _frame(pd, sheet_name, rows):
+    # Empty cells read back from the exported workbook as NaN
+    return pd.DataFrame([[value if value not in (None, "") else float("nan") for value in row] for row in rows],
+                        columns=SHEETS[sheet_name], dtype=object)
+
+
+def render_svg(circuit_ids, rows, title=""):
+    """Draw ``circuit_ids`` (in circuit letter/position order) to SVG bytes"""
+    conv = converter()
+    pd = conv.pd
+    from matplotlib.figure import Figure
+
+    with _draw_lock:
+        frames = {name: _frame(pd, name, rows[name]) for name in DRAWING_SHEETS}
+        conv.set_sheet_data(*(frames[name] for name in DRAWING_SHEETS))
+        circuits = conv.df_circuit
+        wanted = circuits[circuits["circuit_id"].isin(circuit_ids)]
+        wanted = wanted.sort_values(["letter_order", "position"], na_position="last")
+        ordered = list(dict.fromkeys(wanted["circuit_id"].tolist() or list(circuit_ids)))
+
+        fig = Figure()
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.axis("off")
+        conv.draw_symbols(conv.df_symbols, ax, ordered, title, max_rows_visible=len(ordered) * 4,
+                          page_frame=False)
+        ax.relim()
+        ax.autoscale_view()
+        (x0, x1), (y0, y1) = ax.get_xlim(), ax.get_ylim()
+        ax.set_xlim(x0 - MARGIN_UNITS, x1 + MARGIN_UNITS)
+        ax.set_ylim(y0 - MARGIN_UNITS, y1 + MARGIN_UNITS)
+        fig.set_size_inches((x1 - x0 + 2 * MARGIN_UNITS) * INCHES_PER_UNIT,
+                            (y1 - y0 + 2 * MARGIN_UNITS) * INCHES_PER_UNIT)
+        if title:
+            ax.set_title(title, fontsize=20, fontweight="bold", loc="left")
+
+        out = io.BytesIO()
+        fig.savefig(out, format="svg", bbox_inches="tight", pad_inches=0.2, facecolor="white")
+    return out.getvalue()
+
+
+def circuit_svg(project_id, circuit_ids, title="", cache_seconds=DEFAULT_CACHE_SECONDS):
+    """SVG for ``circuit_ids``, from the cache if their rows have not changed.
+
+    Returns (svg bytes, content key).
+    """
+    rows = drawing_rows(project_id, circuit_ids)
+    key = content_key(circuit_ids, rows, title)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and now - entry[0] < cache_seconds:
+            _cache.move_to_end(key)
+            return entry[1], key
+
+    svg = render_svg(circuit_ids, rows, title)
+    with _cache_lock:
+        _cache[key] = (now, svg)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return svg, key
@@ -0,0 +1,41 @@
+from sqlalchemy import insert, literal, select
+from .models import db, Project, MODEL_MAP
+from .stats import project_stats, copy_project_stats
+from .partitioning import ensure_project_partitions
+
+
+def clone_project(source_id, name, description=None):
+    """Copy a project and all of its sheet rows; return the new Project.
+
+    Each sheet table is copied with a single ``INSERT ... SELECT`` so no rows
+    pass through Python, and everything happens in one transaction: either
+    the whole clone is committed or nothing is. Rows keep their order (new
+    ids are assigned in the source's id order).
+    """
+    source = db.session.get(Project, source_id)
+    if source is None:
+        return None
+    # Make sure the source has maintained counts to copy
+    project_stats([source_id])
+
+    try:
+        project = Project(name=name, description=description if description is not None else source.description)
+        db.session.add(project)
+        db.session.flush()
+        ensure_project_partitions(project.id)
+
+        for model in MODEL_MAP.values():
+            columns = [column for column in model.__table__.columns
+                       if column.name not in ('id', 'project_id')]
+            rows = (select(literal(project.id), *columns)
+                    .where(model.project_id == source_id)
+                    .order_by(model.id))
+            db.session.execute(insert(model.__table__).from_select(
+                ['project_id'] + [column.name for column in columns], rows))
+
+        copy_project_stats(source_id, project.id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return project
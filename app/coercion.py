@@ -0,0 +1,95 @@
+import math
+from .models import db, MODEL_MAP
+from .schemas import SHEETS
+
+# Accepted spellings for Y/N flag columns
+TRUE_VALUES = {'Y', 'YES', 'TRUE', 'T', '1'}
+FALSE_VALUES = {'N', 'NO', 'FALSE', 'F', '0'}
+
+
+def parse_int(value):
+    """Integer from a cell value; accepts 12, 12.0 and "12.0" but not 12.5"""
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not an integer")
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{value!r} is not an integer") from None
+    if not math.isfinite(number) or not number.is_integer():
+        raise ValueError(f"{value!r} is not an integer")
+    return int(number)
+
+
+def parse_float(value):
+    """Float from a cell value"""
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not a number")
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{value!r} is not a number") from None
+    if not math.isfinite(number):
+        raise ValueError(f"{value!r} is not a number")
+    return number
+
+
+def parse_bool(value):
+    """Boolean from a Y/N style cell value"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().upper()
+    if text.endswith('.0'):
+        text = text[:-2]
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"{value!r} is not a Y/N value")
+
+
+def _parser_for(column):
+    if isinstance(column.type, db.Boolean):
+        return parse_bool
+    if isinstance(column.type, db.Integer):
+        return parse_int
+    if isinstance(column.type, db.Float):
+        return parse_float
+    return None
+
+
+def column_parsers(sheet_name):
+    """Return one parser (or None for text columns) per column of SHEETS[sheet_name]"""
+    table = MODEL_MAP[sheet_name].__table__
+    return [_parser_for(table.c[col]) for col in SHEETS[sheet_name]]
+
+
+def coerce_data(sheet_name, data):
+    """Coerce a {column: value} dict of stripped strings/None to column types.
+
+    Returns (coerced, errors) where errors is a list of
+    {'column': ..., 'value': ..., 'message': ...} dicts.
+    """
+    coerced = dict(data)
+    errors = []
+    for col, parser in zip(SHEETS[sheet_name], column_parsers(sheet_name)):
+        value = data.get(col)
+        if parser is None or value is None:
+            continue
+        try:
+            coerced[col] = parser(value)
+        except ValueError as e:
+            errors.append({'column': col, 'value': value, 'message': str(e)})
+    return coerced, errors
+
+
+def format_value(value):
+    """Render a typed column value for display and export (flags as Y/N)"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'Y' if value else 'N'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
@@ -0,0 +1,130 @@
+import json
+from datetime import timedelta
+from sqlalchemy import select
+from .models import db, Project, ConversionRun, get_ist_wall_time
+
+# History of Excel to PDF conversions. The converter prints one
+# "CONVERSION STATS: {...}" line with its phase timings, page count and
+# peak memory; the web app adds the interpreter startup (converter wall
+# time not covered by its phases) and the time spent storing the output.
+PHASES = ("startup", "load", "layout", "render", "store")
+STATS_PREFIX = "CONVERSION STATS: "
+SUMMARY_CHARS = 500
+DEFAULT_WINDOW_DAYS = 30
+# Runs this recent are compared against the rest of the window
+RECENT_DAYS = 7
+
+
+def parse_run_stats(stdout):
+    """The converter's stats dict from its output, or None if it printed none"""
+    for line in reversed((stdout or "").splitlines()):
+        if line.startswith(STATS_PREFIX):
+            try:
+                return json.loads(line[len(STATS_PREFIX):])
+            except ValueError:
+                return None
+    return None
+
+
+def output_summary(text, limit=SUMMARY_CHARS):
+    """Tail of a converter output stream, or None if it is empty"""
+    # TimeoutExpired carries the partial output as bytes even in text mode
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", errors="replace")
+    text = (text or "").strip()
+    return text[-limit:] or None
+
+
+def record_conversion(project_id, status, duration, converter_seconds=None, stats=None, **fields):
+    """Store one conversion run; failures are logged, never raised.
+
+    ``stats`` is the converter's parsed stats line, ``converter_seconds``
+    the wall time of the converter process; other ConversionRun columns
+    can be passed as keyword arguments.
+    """
+    stats = stats or {}
+    phases = stats.get("phases") or {}
+    run = ConversionRun(project_id=project_id, status=status, duration_seconds=duration,
+                        load_seconds=phases.get("load"), layout_seconds=phases.get("layout"),
+                        render_seconds=phases.get("render"), page_count=stats.get("pages"),
+                        junction_count=stats.get("junctions"), peak_memory_kb=stats.get("peak_memory_kb"),
+                        checksum=stats.get("checksum"), **fields)
+    if converter_seconds is not None and phases:
+        run.startup_seconds = max(converter_seconds - sum(phases.values()), 0.0)
+    try:
+        db.session.add(run)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print("Could not record conversion run:", e)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def recent_runs(limit=50, project_id=None):
+    """Latest runs, newest first, as (run, project name) pairs"""
+    query = (select(ConversionRun, Project.name)
+             .join(Project, Project.id == ConversionRun.project_id)
+             .order_by(ConversionRun.created_date.desc(), ConversionRun.id.desc())
+             .limit(limit))
+    if project_id:
+        query = query.where(ConversionRun.project_id == project_id)
+    return db.session.execute(query).all()
+
+
+def _durations(values):
+    values = sorted(values)
+    return {"runs": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95)}
+
+
+def duration_trends(days=DEFAULT_WINDOW_DAYS, project_id=None, now=None):
+    """Per-project duration percentiles of successful runs over the last ``days``.
+
+    Returns a list of dicts, slowest p95 first, with overall ``runs``,
+    ``p50`` and ``p95``, the ``recent`` and ``baseline`` p95 (last
+    RECENT_DAYS vs the rest of the window) and their ``change`` ratio,
+    ``max_pages``, ``max_memory_kb`` and per-day ``days`` entries.
+    Both window bounds are naive IST wall times, like created_date.
+    """
+    now = get_ist_wall_time(now)
+    since = now - timedelta(days=days)
+    recent_since = now - timedelta(days=RECENT_DAYS)
+    query = (select(ConversionRun.project_id, Project.name, ConversionRun.created_date,
+                    ConversionRun.duration_seconds, ConversionRun.page_count, ConversionRun.peak_memory_kb)
+             .join(Project, Project.id == ConversionRun.project_id)
+             .where(ConversionRun.status == "success", ConversionRun.created_date >= since,
+                    ConversionRun.duration_seconds.isnot(None)))
+    if project_id:
+        query = query.where(ConversionRun.project_id == project_id)
+
+    projects = {}
+    for pid, name, created, duration, pages, memory in db.session.execute(query):
+        project = projects.setdefault(pid, {"project_id": pid, "name": name, "all": [], "recent": [],
+                                            "baseline": [], "days": {}, "max_pages": None,
+                                            "max_memory_kb": None})
+        project["all"].append(duration)
+        project["recent" if created >= recent_since else "baseline"].append(duration)
+        project["days"].setdefault(created.date(), []).append(duration)
+        if pages is not None:
+            project["max_pages"] = max(project["max_pages"] or 0, pages)
+        if memory is not None:
+            project["max_memory_kb"] = max(project["max_memory_kb"] or 0, memory)
+
+    trends = []
+    for project in projects.values():
+        overall = _durations(project.pop("all"))
+        recent = percentile(sorted(project.pop("recent")), 95)
+        baseline = percentile(sorted(project.pop("baseline")), 95)
+        project.update(overall, recent=recent, baseline=baseline,
+                       change=recent / baseline if recent and baseline else None,
+                       days=[dict(_durations(values), day=day)
+                             for day, values in sorted(project["days"].items(), reverse=True)])
+        trends.append(project)
+    trends.sort(key=lambda project: project["p95"], reverse=True)
+    return trends
@@ -0,0 +1,224 @@
+import csv
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from openpyxl import Workbook
+from sqlalchemy import select
+from .models import db, Project, MODEL_MAP
+from .schemas import SHEETS
+from .coercion import column_parsers, format_value
+from .importer import copy_driver
+from .artifacts import artifact_name, artifact_path, store_file, temp_path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export/import is optional
+    pa = pq = None
+
+# Rows fetched per round trip from the server-side cursor
+DEFAULT_FETCH_SIZE = 2000
+
+
+def iter_sheet_values(sheet_name, project_id, fetch_size=None):
+    """Yield value tuples of one sheet for a project, ordered by id.
+
+    Only the sheet's columns are selected, and rows are streamed with
+    ``yield_per`` (a server-side cursor on PostgreSQL) instead of loading
+    every ORM object at once.
+    """
+    model = MODEL_MAP[sheet_name]
+    columns = [getattr(model, col) for col in SHEETS[sheet_name]]
+    query = (select(*columns)
+             .where(model.project_id == project_id)
+             .order_by(model.id)
+             .execution_options(yield_per=fetch_size or DEFAULT_FETCH_SIZE))
+    for row in db.session.execute(query):
+        yield tuple(row)
+
+
+def write_project_xlsx(project_id, fileobj, fetch_size=None):
+    """Write all sheets of a project into ``fileobj`` as an XLSX workbook.
+
+    Uses a write-only workbook, which spools each sheet to disk as rows are
+    appended, so memory stays flat regardless of project size. Returns the
+    number of data rows written.
+    """
+    wb = Workbook(write_only=True)
+    total_records = 0
+    for sheet_name, columns in SHEETS.items():
+        ws = wb.create_sheet(title=sheet_name)
+        ws.append(columns)
+        for values in iter_sheet_values(sheet_name, project_id, fetch_size):
+            ws.append([format_value(value) or "" for value in values])
+            total_records += 1
+    wb.save(fileobj)
+    return total_records
+
+
+def export_cache_name(project):
+    """Artifact name of the cached XLSX export of ``project`` at its current version"""
+    # created_date guards against a reused id after a project was deleted
+    key = f"project-export:{project.id}:{project.created_date}:{project.version}"
+    return artifact_name(hashlib.sha256(key.encode("utf-8")).hexdigest(), "xlsx")
+
+
+def cached_project_xlsx(project, fetch_size=None):
+    """XLSX export of ``project``, built once per project version.
+
+    Returns (path or fileobj, cached). The workbook is kept in the artifact
+    store under export_cache_name, unless the project was written to while
+    it was being built; that export is served once and not cached.
+    """
+    name = export_cache_name(project)
+    path = artifact_path(name)
+    if path:
+        return path, True
+
+    path = temp_path("xlsx")
+    try:
+        with open(path, "wb") as fileobj:
+            write_project_xlsx(project.id, fileobj, fetch_size)
+        version = db.session.execute(select(Project.version).where(Project.id == project.id)).scalar()
+    except BaseException:
+        os.remove(path)
+        raise
+    if version == project.version:
+        return artifact_path(store_file(path, name)), False
+    # Windows cannot remove a file that is still open, so the one-off
+    # export is served from a TemporaryFile, which goes away when closed
+    fileobj = tempfile.TemporaryFile()
+    try:
+        with open(path, "rb") as built:
+            shutil.copyfileobj(built, fileobj)
+    except BaseException:
+        fileobj.close()
+        raise
+    finally:
+        os.remove(path)
+    fileobj.seek(0)
+    return fileobj, False
+
+
+def _copy_sheet_csv(driver, sheet_name, project_id, fileobj):
+    """Write one sheet as CSV with PostgreSQL ``COPY ... TO STDOUT``"""
+    model = MODEL_MAP[sheet_name]
+    select_list = []
+    for col in SHEETS[sheet_name]:
+        # Flags are exported as Y/N, like the other export paths
+        if isinstance(model.__table__.c[col].type, db.Boolean):
+            select_list.append(f'CASE WHEN "{col}" THEN \'Y\' WHEN NOT "{col}" THEN \'N\' END AS "{col}"')
+        else:
+            select_list.append(f'"{col}"')
+    column_list = ', '.join(select_list)
+    sql = (f'COPY (SELECT {column_list} FROM {model.__tablename__} '
+           f'WHERE project_id = {int(project_id)} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)')
+    cursor = db.session.connection().connection.cursor()
+    try:
+        if driver == 'psycopg':
+            with cursor.copy(sql) as copy:
+                for data in copy:
+                    fileobj.write(data)
+        else:
+            cursor.copy_expert(sql, fileobj)
+    finally:
+        cursor.close()
+
+
+def _write_sheet_csv(sheet_name, project_id, fileobj, fetch_size=None):
+    """Write one sheet as CSV through the streaming row iterator"""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(SHEETS[sheet_name])
+    for values in iter_sheet_values(sheet_name, project_id, fetch_size):
+        writer.writerow([format_value(value) for value in values])
+    text.detach()
+
+
+def _arrow_type(column):
+    """Parquet type of a model column; integer, float and flag columns keep their types"""
+    if isinstance(column.type, db.Boolean):
+        return pa.bool_()
+    if isinstance(column.type, db.Integer):
+        return pa.int64()
+    if isinstance(column.type, db.Float):
+        return pa.float64()
+    return pa.string()
+
+
+def parquet_schema(sheet_name):
+    """Arrow schema of one sheet, built from its model's column types"""
+    table = MODEL_MAP[sheet_name].__table__
+    return pa.schema([(col, _arrow_type(table.c[col])) for col in SHEETS[sheet_name]])
+
+
+def _write_sheet_parquet(sheet_name, project_id, fileobj, fetch_size=None):
+    """Write one sheet as a Parquet file, one row group per fetched batch"""
+    schema = parquet_schema(sheet_name)
+    parsers = column_parsers(sheet_name)
+    batch_size = fetch_size or DEFAULT_FETCH_SIZE
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        batch = []
+        for values in iter_sheet_values(sheet_name, project_id, fetch_size):
+            batch.append(values)
+            if len(batch) >= batch_size:
+                writer.write_table(_parquet_table(schema, parsers, batch))
+                batch = []
+        if batch:
+            writer.write_table(_parquet_table(schema, parsers, batch))
+
+
+def _typed_value(value, parser):
+    # Columns not yet converted by 'flask upgrade-db' still hold text
+    if value.__class__ is not str:
+        return value
+    try:
+        return parser(value) if value.strip() else None
+    except ValueError:
+        return None
+
+
+def _parquet_table(schema, parsers, rows):
+    """Build an Arrow table from a batch of value tuples"""
+    arrays = []
+    for column, parser, field in zip(zip(*rows), parsers, schema):
+        if parser is None:
+            values = [format_value(value) for value in column]
+        else:
+            values = [None if value is None else _typed_value(value, parser) for value in column]
+        arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def export_project_archive(project_id, fmt, fetch_size=None):
+    """Export every sheet of a project as ``<sheet>.<fmt>`` members of a zip.
+
+    ``fmt`` is 'csv' or 'parquet'. CSV uses COPY TO STDOUT on PostgreSQL. Each member is spooled to disk before being added to
+    the archive, so memory stays flat. Returns a rewound temporary file.
+    """
+    if fmt == 'parquet' and pq is None:
+        raise RuntimeError('Parquet export requires the pyarrow package')
+    driver = copy_driver() if fmt == 'csv' else None
+
+    archive_file = tempfile.TemporaryFile()
+    try:
+        with zipfile.ZipFile(archive_file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for sheet_name in SHEETS:
+                with tempfile.TemporaryFile() as member:
+                    if driver:
+                        _copy_sheet_csv(driver, sheet_name, project_id, member)
+                    elif fmt == 'csv':
+                        _write_sheet_csv(sheet_name, project_id, member, fetch_size)
+                    else:
+                        _write_sheet_parquet(sheet_name, project_id, member, fetch_size)
+                    member.seek(0)
+                    with archive.open(f'{sheet_name}.{fmt}', 'w', force_zip64=True) as target:
+                        shutil.copyfileobj(member, target)
+    except Exception:
+        archive_file.close()
+        raise
+    archive_file.seek(0)
+    return archive_file
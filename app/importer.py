@@ -0,0 +1,569 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from itertools import compress, islice, zip_longest
+from operator import itemgetter
+from openpyxl import load_workbook
+from sqlalchemy import bindparam, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from .models import db, get_ist_now
+from .schemas import SHEETS, NATURAL_KEYS
+from .coercion import TRUE_VALUES, FALSE_VALUES, column_parsers, parse_bool
+from .stats import SHEET_NAMES, adjust_row_counts
+from .migrations import index_is_valid
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export/import is optional
+    pq = None
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Native xlsx reading is optional (IMPORT_CALAMINE_MAX_BYTES)
+    CalamineWorkbook = None
+
+# Rows per INSERT batch and rows per COMMIT when no app config is available
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_COMMIT_ROWS = 50000
+
+
+def find_sheet(sheetnames, sheet_name):
+    """Return the workbook sheet name matching ``sheet_name`` (case insensitive)"""
+    for ws_name in sheetnames:
+        if ws_name.lower() == sheet_name.lower():
+            return ws_name
+    return None
+
+
+def map_headers(header_row, expected_headers):
+    """Match the sheet header row against expected columns (case insensitive).
+
+    Returns (header_mapping, missing_headers) where header_mapping maps each
+    expected column to its index in the sheet row.
+    """
+    headers = []
+    for value in header_row:
+        headers.append(str(value).strip().lower() if value else '')
+
+    header_mapping = {}
+    missing_headers = []
+    for required_header in expected_headers:
+        try:
+            header_mapping[required_header] = headers.index(required_header.lower())
+        except ValueError:
+            missing_headers.append(required_header)
+    return header_mapping, missing_headers
+
+
+# Rows parsed together by iter_records; work is done column by column per batch
+PARSE_BATCH_ROWS = 5000
+
+
+def _cell_text(value):
+    """Text form of a non-string cell value (None for empty cells)"""
+    if value is None:
+        return None
+    if value.__class__ is float and value.is_integer():
+        # calamine reads every number as float; keep "12" rather than "12.0"
+        return str(int(value))
+    return str(value).strip() or None
+
+
+def _bool_lookup():
+    lookup = {value: True for value in TRUE_VALUES}
+    lookup.update({value: False for value in FALSE_VALUES})
+    return lookup
+
+
+_BOOL_LOOKUP = _bool_lookup()
+
+
+def _parse_column(values, parser, column, sheet_name, first_row, errors, bad_rows):
+    """Coerce one normalized column; failures go to ``errors`` and ``bad_rows``"""
+    if parser is parse_bool:
+        # Exact Y/N spellings resolve with a dict lookup; anything else goes
+        # through the parser (which also raises the error message)
+        lookup = _BOOL_LOOKUP
+        parsed = [None if value is None else lookup.get(value.upper(), value) for value in values]
+        pending = [i for i, value in enumerate(parsed) if value.__class__ is str]
+    else:
+        parsed = list(values)
+        pending = [i for i, value in enumerate(values) if value is not None]
+
+    for i in pending:
+        try:
+            parsed[i] = parser(values[i])
+        except ValueError as e:
+            bad_rows.add(i)
+            if errors is not None:
+                errors.append({'sheet': sheet_name, 'row': first_row + i, 'column': column,
+                               'value': values[i], 'message': str(e)})
+    return parsed
+
+
+def parse_batch(rows, sheet_name, indexes, parsers, errors=None, first_row=2):
+    """Turn a batch of raw sheet rows into typed record tuples, column-wise.
+
+    The batch is transposed once; each needed column is then stripped and
+    null-filled with a single comprehension, empty rows are found from the
+    transposed columns, and typed columns are coerced in one pass. Rows with
+    a value that cannot be coerced are dropped and described in ``errors``.
+    """
+    columns = list(zip_longest(*rows))
+    empty = (None,) * len(rows)
+    expected_headers = SHEETS[sheet_name]
+
+    text_columns = []
+    for col_index in indexes:
+        values = columns[col_index] if col_index < len(columns) else empty
+        text_columns.append([(value.strip() or None) if value.__class__ is str else _cell_text(value)
+                             for value in values])
+
+    has_data = list(map(any, zip(*text_columns)))
+    bad_rows = set()
+    first_error = len(errors) if errors is not None else 0
+    typed_columns = []
+    for column, values, parser in zip(expected_headers, text_columns, parsers):
+        if parser is None:
+            typed_columns.append(values)
+        else:
+            typed_columns.append(_parse_column(values, parser, column, sheet_name, first_row, errors, bad_rows))
+
+    if errors is not None and bad_rows:
+        # Columns are checked one after another; report the batch in row order
+        errors[first_error:] = sorted(errors[first_error:], key=itemgetter('row'))
+    for i in bad_rows:
+        has_data[i] = False
+    return list(compress(zip(*typed_columns), has_data))
+
+
+def iter_records(rows, sheet_name, header_mapping, errors=None, first_row=2):
+    """Yield one plain tuple of typed values per non-empty sheet row.
+
+    Values are stripped strings, with blanks turned into None, then coerced
+    to the column types of the sheet's model. Rows where every column is
+    empty are skipped. Rows with a value that cannot be coerced are skipped
+    and described in ``errors`` (a list) as
+    {'sheet', 'row', 'column', 'value', 'message'} dicts. Rows are
+    processed in batches of PARSE_BATCH_ROWS by parse_batch.
+    """
+    indexes = [header_mapping[header] for header in SHEETS[sheet_name]]
+    parsers = column_parsers(sheet_name)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, PARSE_BATCH_ROWS))
+        if not batch:
+            return
+        yield from parse_batch(batch, sheet_name, indexes, parsers, errors, first_row)
+        first_row += len(batch)
+
+
+def _file_size(fileobj):
+    position = fileobj.tell()
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(position)
+    return size
+
+
+class WorkbookReader:
+    """Read-only access to the sheets of an uploaded xlsx file.
+
+    By default the workbook is opened with openpyxl's read-only mode, so
+    it is read from ``fileobj`` (the upload's spooled temporary file) as
+    needed rather than loaded into memory. With ``calamine_max_bytes`` set
+    and python-calamine installed, files up to that size are read with
+    calamine instead: it parses natively, several times faster, but holds
+    the whole file and each sheet in memory.
+    """
+
+    def __init__(self, fileobj, calamine_max_bytes=None):
+        self.calamine = (CalamineWorkbook is not None and bool(calamine_max_bytes)
+                         and _file_size(fileobj) <= calamine_max_bytes)
+        if self.calamine:
+            self._workbook = CalamineWorkbook.from_filelike(fileobj)
+            self.sheetnames = list(self._workbook.sheet_names)
+        else:
+            self._workbook = load_workbook(fileobj, read_only=True, data_only=True)
+            self.sheetnames = self._workbook.sheetnames
+
+    def rows(self, ws_name):
+        """Return (row number of the first row, iterator of row value sequences)"""
+        if self.calamine:
+            sheet = self._workbook.get_sheet_by_name(ws_name)
+            # calamine starts at the first non-empty cell; leading blank rows are dropped
+            start = sheet.start[0] + 1 if sheet.start else 1
+            return start, sheet.iter_rows()
+        ws = self._workbook[ws_name]
+        # Some writers store a wrong dimension; read until the real last row
+        ws.reset_dimensions()
+        return 1, ws.iter_rows(values_only=True)
+
+    def close(self):
+        self._workbook.close()
+
+
+def sheet_records(reader, ws_name, sheet_name, errors=None):
+    """Stream typed records from sheet ``ws_name`` of a WorkbookReader.
+
+    Returns (records, missing_headers); records is None when required
+    columns are missing. Rows that fail coercion are reported in ``errors``.
+    """
+    header_row_number, rows = reader.rows(ws_name)
+    header_mapping, missing_headers = map_headers(next(rows, None) or (), SHEETS[sheet_name])
+    if missing_headers:
+        return None, missing_headers
+    return iter_records(rows, sheet_name, header_mapping, errors, first_row=header_row_number + 1), []
+
+
+def workbook_records(fileobj, sheet_names, errors=None, calamine_max_bytes=None):
+    """Yield (sheet_name, records, missing_headers) for every recognized sheet.
+
+    ``fileobj`` is the xlsx upload and ``sheet_names`` lists the sheets to
+    look for. The sheets are streamed one after the other through a single
+    WorkbookReader (see there for ``calamine_max_bytes``). Coercion errors
+    are appended to ``errors``.
+    """
+    reader = WorkbookReader(fileobj, calamine_max_bytes)
+    try:
+        for sheet_name in sheet_names:
+            ws_name = find_sheet(reader.sheetnames, sheet_name)
+            if ws_name:
+                records, missing_headers = sheet_records(reader, ws_name, sheet_name, errors)
+                yield sheet_name, records, missing_headers
+    finally:
+        reader.close()
+
+
+def _csv_rows(member):
+    text = io.TextIOWrapper(member, encoding='utf-8-sig', newline='')
+    yield from csv.reader(text)
+
+
+def _parquet_rows(member):
+    # Parquet needs random access; spool the zip member to disk first
+    with tempfile.TemporaryFile() as spool:
+        shutil.copyfileobj(member, spool)
+        spool.seek(0)
+        parquet_file = pq.ParquetFile(spool)
+        yield parquet_file.schema_arrow.names
+        for batch in parquet_file.iter_batches():
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def archive_records(fileobj, fmt, sheet_names, errors=None):
+    """Yield (sheet_name, records, missing_headers) from a zipped CSV/Parquet export.
+
+    Members are matched to ``sheet_names`` by file name (``<sheet>.<fmt>``,
+    case insensitive) and validated and coerced with the same rules as XLSX
+    uploads. Records are streamed from each member in turn.
+    """
+    if fmt == 'parquet' and pq is None:
+        raise RuntimeError('Parquet import requires the pyarrow package')
+    read_rows = _csv_rows if fmt == 'csv' else _parquet_rows
+
+    with zipfile.ZipFile(fileobj) as archive:
+        members = {}
+        for info in archive.infolist():
+            stem, ext = os.path.splitext(os.path.basename(info.filename))
+            if ext.lower() == f'.{fmt}':
+                members[stem] = info
+
+        for sheet_name in sheet_names:
+            member_name = find_sheet(members, sheet_name)
+            if not member_name:
+                continue
+            with archive.open(members[member_name]) as member:
+                rows = read_rows(member)
+                header_mapping, missing_headers = map_headers(next(rows, None) or (), SHEETS[sheet_name])
+                if missing_headers:
+                    yield sheet_name, None, missing_headers
+                else:
+                    yield sheet_name, iter_records(rows, sheet_name, header_mapping, errors), []
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def copy_driver():
+    """Return the DBAPI driver name when PostgreSQL COPY can be used, else None.
+
+    Both psycopg2 and psycopg (3) expose COPY, with different APIs.
+    """
+    dialect = db.session.get_bind().dialect
+    if dialect.name == 'postgresql' and dialect.driver in ('psycopg2', 'psycopg'):
+        return dialect.driver
+    return None
+
+
+def _copy_chunk(driver, table, columns, project_id, chunk, created):
+    """Stream one chunk into ``table`` with COPY FROM STDIN"""
+    column_list = ', '.join(f'"{col}"' for col in ['project_id', 'created_date'] + list(columns))
+    cursor = db.session.connection().connection.cursor()
+    try:
+        if driver == 'psycopg':
+            with cursor.copy(f'COPY {table.name} ({column_list}) FROM STDIN') as copy:
+                for values in chunk:
+                    copy.write_row((project_id, created) + values)
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in chunk:
+            writer.writerow((project_id, created) + values)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {table.name} ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def bulk_insert(model, columns, project_id, records, chunk_size=None, commit_rows=None, commit=True):
+    """Insert plain value tuples for ``columns`` into ``model``'s table.
+
+    Records are written in chunks of ``chunk_size`` rows, using COPY on
+    PostgreSQL and an executemany INSERT otherwise. The session is
+    committed every ``commit_rows`` rows and once more at the end, unless
+    ``commit`` is False, in which case the caller owns the transaction.
+    The project's maintained row counts are adjusted in the same transaction
+    as the rows. Returns the number of inserted rows.
+
+    A row whose natural key is already taken raises ValueError; rows
+    committed by earlier batches stay and the message says how many.
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    commit_rows = commit_rows or DEFAULT_COMMIT_ROWS
+    table = model.__table__
+    sheet_name = SHEET_NAMES[model]
+    driver = copy_driver()
+    created = get_ist_now()
+
+    inserted = 0
+    uncommitted = 0
+    for chunk in _chunks(records, chunk_size):
+        try:
+            if driver:
+                _copy_chunk(driver, table, columns, project_id, chunk, created)
+            else:
+                params = []
+                for values in chunk:
+                    data = dict(zip(columns, values))
+                    data['project_id'] = project_id
+                    params.append(data)
+                db.session.execute(table.insert(), params)
+        # COPY raises the driver's own exception class
+        except (IntegrityError, db.engine.dialect.dbapi.IntegrityError):
+            committed = inserted - uncommitted
+            key = ", ".join(NATURAL_KEYS[sheet_name])
+            raise ValueError(
+                f"Rows repeat a ({key}) key already in the project or file; import them with "
+                f"upsert or sync instead. "
+                + (f"The first {committed} rows of {sheet_name} were already saved."
+                   if committed else f"No {sheet_name} rows were saved.")) from None
+
+        inserted += len(chunk)
+        uncommitted += len(chunk)
+        if commit and uncommitted >= commit_rows:
+            adjust_row_counts(project_id, {sheet_name: uncommitted})
+            db.session.commit()
+            uncommitted = 0
+
+    if uncommitted:
+        adjust_row_counts(project_id, {sheet_name: uncommitted})
+        if commit:
+            db.session.commit()
+    return inserted
+
+
+# Import modes offered by the upload forms
+IMPORT_MODES = {
+    "append": "Append all rows",
+    "upsert": "Update matching rows, insert new ones",
+    "sync": "Update matching rows, insert new ones, delete rows missing from the file",
+}
+
+
+def natural_key_index(table):
+    """Name of the unique (project_id, *NATURAL_KEYS) index of a sheet table"""
+    return f"ux_{table.name}_natural_key"
+
+
+def _has_natural_key_index(table):
+    """True if upserts into ``table`` can use INSERT ... ON CONFLICT"""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    # Missing or invalid when duplicate keys kept 'flask upgrade-db' from building it
+    return bool(index_is_valid(db.session.connection(), natural_key_index(table)))
+
+
+def _upsert_on_conflict(table, columns, project_id, records, key_columns, delete_missing, chunk_size):
+    """upsert_records on PostgreSQL, matching keys through the unique index.
+
+    Ids of the rows written are collected in a temporary table for the
+    ``delete_missing`` pass, so nothing proportional to the sheet is held
+    in memory.
+    """
+    key_indexes = [columns.index(col) for col in key_columns]
+    stmt = pg_insert(table)
+    stmt = (stmt.on_conflict_do_update(index_elements=['project_id', *key_columns],
+                                       set_={col: stmt.excluded[col] for col in columns
+                                             if col not in key_columns})
+            .returning(table.c.id, literal_column("xmax = 0")))
+    if delete_missing:
+        db.session.execute(text("CREATE TEMP TABLE IF NOT EXISTS upsert_written "
+                                "(id integer PRIMARY KEY) ON COMMIT DROP"))
+        db.session.execute(text("TRUNCATE upsert_written"))
+        written_stmt = text("INSERT INTO upsert_written (id) VALUES (:id) ON CONFLICT DO NOTHING")
+
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    for chunk in _chunks(records, chunk_size):
+        # One statement cannot write a row twice; the last occurrence of a key wins
+        params = {}
+        for position, values in enumerate(chunk):
+            data = dict(zip(columns, values), project_id=project_id)
+            key = tuple(values[i] for i in key_indexes)
+            params[position if None in key else key] = data
+        written = db.session.execute(stmt, list(params.values())).all()
+        inserted = sum(1 for _, is_new in written if is_new)
+        counts['inserted'] += inserted
+        counts['updated'] += len(written) - inserted
+        if delete_missing:
+            db.session.execute(written_stmt, [{'id': row_id} for row_id, _ in written])
+
+    if delete_missing:
+        result = db.session.execute(
+            table.delete().where(table.c.project_id == project_id,
+                                 text(f"NOT EXISTS (SELECT 1 FROM upsert_written w "
+                                      f"WHERE w.id = {table.name}.id)")))
+        counts['deleted'] = result.rowcount
+    return counts
+
+
+def upsert_records(model, columns, project_id, records, delete_missing=False, chunk_size=None):
+    """Merge records into a project's sheet on the sheet's natural key.
+
+    Existing rows whose (project_id, *NATURAL_KEYS) match an incoming record
+    are updated in place, other records are inserted, and with
+    ``delete_missing`` rows whose key does not appear in the file (including
+    duplicate rows left over from earlier appends) are deleted. All writes
+    are executemany statements in chunks; the caller commits. Returns
+    {'inserted': n, 'updated': n, 'deleted': n}.
+
+    On PostgreSQL this is INSERT ... ON CONFLICT on the sheet's unique
+    natural key index. Elsewhere, or while that index is missing, the
+    project's keys are loaded into a dict and matched here.
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    table = model.__table__
+    sheet_name = SHEET_NAMES[model]
+    key_columns = NATURAL_KEYS[sheet_name]
+    if _has_natural_key_index(table):
+        counts = _upsert_on_conflict(table, columns, project_id, records, key_columns,
+                                     delete_missing, chunk_size)
+        adjust_row_counts(project_id, {sheet_name: counts['inserted'] - counts['deleted']})
+        return counts
+
+    key_indexes = [columns.index(col) for col in key_columns]
+
+    # key -> id of the first existing row with that key; every other id may be deleted
+    existing = {}
+    unmatched_ids = set()
+    query = (select(table.c.id, *[table.c[col] for col in key_columns])
+             .where(table.c.project_id == project_id).order_by(table.c.id))
+    for row in db.session.execute(query):
+        key = tuple(row[1:])
+        if None in key or key in existing:
+            unmatched_ids.add(row[0])
+        else:
+            existing[key] = row[0]
+    unmatched_ids.update(existing.values())
+
+    update_stmt = (table.update()
+                   .where(table.c.id == bindparam('_id'))
+                   .values({col: bindparam(col) for col in columns}))
+    insert_stmt = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    for chunk in _chunks(records, chunk_size):
+        updates = {}
+        inserts = []
+        insert_keys = []
+        pending = {}
+        for values in chunk:
+            data = dict(zip(columns, values))
+            key = tuple(values[i] for i in key_indexes)
+            matchable = None not in key
+            row_id = existing.get(key) if matchable else None
+            if row_id is not None:
+                data['_id'] = row_id
+                updates[row_id] = data  # last occurrence in the file wins
+                unmatched_ids.discard(row_id)
+            elif matchable and key in pending:
+                data['project_id'] = project_id
+                inserts[pending[key]] = data
+            else:
+                data['project_id'] = project_id
+                if matchable:
+                    pending[key] = len(inserts)
+                inserts.append(data)
+                insert_keys.append(key)
+
+        if updates:
+            db.session.execute(update_stmt, list(updates.values()))
+            counts['updated'] += len(updates)
+        if inserts:
+            new_ids = db.session.execute(insert_stmt, inserts).scalars().all()
+            counts['inserted'] += len(inserts)
+            # Later duplicates of a new key update the row inserted here
+            for key, row_id in zip(insert_keys, new_ids):
+                if None not in key:
+                    existing[key] = row_id
+
+    if delete_missing and unmatched_ids:
+        for chunk in _chunks(sorted(unmatched_ids), chunk_size):
+            db.session.execute(table.delete().where(table.c.id.in_(chunk)))
+        counts['deleted'] = len(unmatched_ids)
+
+    adjust_row_counts(project_id, {sheet_name: counts['inserted'] - counts['deleted']})
+    return counts
+
+
+def import_records(model, columns, project_id, records, mode="append", chunk_size=None,
+                   commit_rows=None, commit=True):
+    """Import records with one of IMPORT_MODES.
+
+    'append' goes through bulk_insert (batched commits); 'upsert' and 'sync'
+    go through upsert_records and commit once at the end. ``commit=False``
+    leaves the transaction to the caller. Returns
+    {'inserted': n, 'updated': n, 'deleted': n}.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+    if mode == "append":
+        inserted = bulk_insert(model, columns, project_id, records, chunk_size=chunk_size,
+                               commit_rows=commit_rows, commit=commit)
+        return {'inserted': inserted, 'updated': 0, 'deleted': 0}
+
+    counts = upsert_records(model, columns, project_id, records,
+                            delete_missing=(mode == "sync"), chunk_size=chunk_size)
+    if commit:
+        db.session.commit()
+    return counts
+
+
+def describe_counts(counts):
+    """Human readable summary of an import_records result"""
+    if not counts['updated'] and not counts['deleted']:
+        return f"{counts['inserted']} records"
+    return f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} deleted"
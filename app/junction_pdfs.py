@@ -0,0 +1,132 @@
+import json
+import os
+import zipfile
+from werkzeug.utils import secure_filename
+from .artifacts import artifact_path, derived_name, store_file, temp_path
+
+# One PDF per junction box, written by the converter next to the full PDF
+# when the conversion form asks for it (excel_to_pdf_converter.py
+# --split-junctions) and stored as
+# <pdf hash>-j<n>.pdf. The manifest <pdf hash>-junctions.json lists them in
+# page order and is written last, so its presence means the set is complete.
+SPLIT_MANIFEST = "junctions.json"
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+def manifest_name(pdf_name):
+    return derived_name(pdf_name, "junctions", "json")
+
+
+def junction_name(pdf_name, index):
+    return derived_name(pdf_name, f"j{index}", "pdf")
+
+
+def store_junction_pdfs(pdf_name, split_dir):
+    """Move the converter's split output in ``split_dir`` into the store.
+
+    Returns the number of junction PDFs stored (0 if the directory holds no
+    complete split output).
+    """
+    try:
+        with open(os.path.join(split_dir, SPLIT_MANIFEST)) as f:
+            split = json.load(f)
+    except (OSError, ValueError):
+        return 0
+
+    junctions = []
+    for index, entry in enumerate(split["junctions"], 1):
+        name = store_file(os.path.join(split_dir, entry["file"]), junction_name(pdf_name, index))
+        junctions.append({"index": index, "junction": entry["junction"], "name": name,
+                          "first_page": entry["first_page"], "pages": entry["pages"]})
+
+    manifest = temp_path("json")
+    with open(manifest, "w") as f:
+        json.dump({"total_pages": split["total_pages"], "junctions": junctions}, f)
+    store_file(manifest, manifest_name(pdf_name))
+    return len(junctions)
+
+
+def junction_pdfs(pdf_name):
+    """Junction entries of a stored PDF, or None if they are not (all) there.
+
+    Each entry has ``index``, ``junction``, ``name`` (the artifact),
+    ``first_page`` and ``pages``.
+    """
+    path = artifact_path(manifest_name(pdf_name))
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            junctions = json.load(f)["junctions"]
+    except (OSError, ValueError, KeyError):
+        return None
+    # Junction files can be evicted on their own; treat a partial set as missing
+    if not all(artifact_path(entry["name"]) for entry in junctions):
+        return None
+    return junctions
+
+
+def junction_filename(original_name, entry):
+    """Download name of one junction PDF, e.g. STATION_001_JB-20F.pdf"""
+    stem = original_name.rsplit(".", 1)[0]
+    junction = secure_filename(entry["junction"]) or "junction"
+    return f"{stem}_{entry['index']:03d}_{junction}.pdf"
+
+
+class _ZipStream:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_junction_zip(entries, original_name):
+    """Yield a ZIP of the junction PDFs in ``entries`` as it is built.
+
+    Nothing is spooled to disk: members are stored uncompressed (PDF streams
+    are compressed already) and written straight to the response. The files
+    are opened up front so eviction during the download cannot break it.
+    """
+    files = []
+    try:
+        for entry in entries:
+            path = artifact_path(entry["name"])
+            if not path:
+                raise FileNotFoundError(entry["name"])
+            files.append((junction_filename(original_name, entry), open(path, "rb")))
+    except OSError:
+        for _, fileobj in files:
+            fileobj.close()
+        raise
+
+    def generate():
+        stream = _ZipStream()
+        try:
+            with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+                for member_name, fileobj in files:
+                    with archive.open(member_name, "w", force_zip64=True) as target:
+                        while True:
+                            chunk = fileobj.read(ZIP_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            target.write(chunk)
+                            yield stream.pop()
+                    yield stream.pop()
+            yield stream.pop()
+        finally:
+            for _, fileobj in files:
+                fileobj.close()
+
+    return generate()
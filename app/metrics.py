@@ -0,0 +1,158 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# In-process request metrics exposed in the Prometheus text format on
+# /metrics. Each worker process keeps its own numbers, so scrape every
+# worker (or run one) for complete figures.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BUCKETS = tuple(1024 * 4 ** n for n in range(11))  # 1 KiB .. 1 GiB
+CONVERSION_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        counts, total = self.series.get(label_values, (None, 0.0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[label_values] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self.series.items()):
+            labels = _labels(self.labels, label_values)
+            prefix = labels + "," if labels else ""
+            series = f"{{{labels}}}" if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{series} {total}")
+            lines.append(f"{self.name}_count{series} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, *label_values, amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+_lock = threading.Lock()
+REQUESTS = Counter("http_requests_total", "HTTP requests by endpoint, method and status",
+                   ("endpoint", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by endpoint",
+                            ("endpoint", "method"), LATENCY_BUCKETS)
+REQUEST_STATEMENTS = Histogram("http_request_db_statements", "SQL statements issued per request",
+                               ("endpoint",), STATEMENT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent executing SQL per request",
+                               ("endpoint",), LATENCY_BUCKETS)
+UPLOAD_BYTES = Histogram("upload_bytes", "Size of uploaded files by kind", ("kind",), BYTES_BUCKETS)
+CONVERSION_SECONDS = Histogram("pdf_conversion_duration_seconds", "Excel to PDF conversion time",
+                               ("outcome",), CONVERSION_BUCKETS)
+CONVERSION_BYTES = Histogram("pdf_conversion_output_bytes", "Size of generated PDFs", (), BYTES_BUCKETS)
+METRICS = (REQUESTS, REQUEST_SECONDS, REQUEST_STATEMENTS, REQUEST_DB_SECONDS,
+           UPLOAD_BYTES, CONVERSION_SECONDS, CONVERSION_BYTES)
+
+
+def observe_upload(kind, size):
+    """Record the size of an uploaded file (``size`` may be None if unknown)"""
+    if size is not None:
+        with _lock:
+            UPLOAD_BYTES.observe(size, kind)
+
+
+def observe_conversion(seconds, outcome, output_bytes=None):
+    with _lock:
+        CONVERSION_SECONDS.observe(seconds, outcome)
+        if output_bytes is not None:
+            CONVERSION_BYTES.observe(output_bytes)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._metrics_statement_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and hasattr(g, "_metrics_statement_start"):
+        g.metrics_db_statements = g.get("metrics_db_statements", 0) + 1
+        g.metrics_db_seconds = (g.get("metrics_db_seconds", 0.0)
+                                + time.perf_counter() - g._metrics_statement_start)
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db_statements = 0
+    g.metrics_db_seconds = 0.0
+
+
+def _record_request(response):
+    start = g.get("metrics_start")
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or "unmatched"
+    statements = g.get("metrics_db_statements", 0)
+    db_seconds = g.get("metrics_db_seconds", 0.0)
+
+    with _lock:
+        REQUESTS.inc(endpoint, request.method, response.status_code)
+        REQUEST_SECONDS.observe(elapsed, endpoint, request.method)
+        REQUEST_STATEMENTS.observe(statements, endpoint)
+        REQUEST_DB_SECONDS.observe(db_seconds, endpoint)
+
+    threshold = current_app.config.get("METRICS_QUERY_LOG_THRESHOLD")
+    if threshold and statements > threshold:
+        print(f"QUERY COUNT: {request.method} {request.full_path.rstrip('?')} ({endpoint}) issued "
+              f"{statements} SQL statements in {elapsed * 1000:.0f} ms ({db_seconds * 1000:.0f} ms in SQL)")
+    return response
+
+
+def metrics_view():
+    """Prometheus text exposition of the collected metrics"""
+    with _lock:
+        lines = [line for metric in METRICS for line in metric.render()]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app):
+    """Register the timing hooks and the /metrics endpoint on ``app``"""
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,291 @@
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from .models import db, Project, MODEL_MAP
+from .partitioning import partitioned_tables
+
+# Legacy text -> typed column conversion (PostgreSQL). Each entry gives the
+# SQL type, a condition for values that convert cleanly and the USING
+# expression; values that do not match become NULL.
+_INT_PATTERN = r"'^\s*[-+]?[0-9]+(\.0*)?\s*$'"
+_FLOAT_PATTERN = r"'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'"
+_TRUE_LIST = "('Y', 'YES', 'TRUE', 'T', '1')"
+_FALSE_LIST = "('N', 'NO', 'FALSE', 'F', '0')"
+_CONVERSIONS = {
+    db.Integer: ('integer',
+                 '"{c}" ~ ' + _INT_PATTERN,
+                 'CASE WHEN "{c}" ~ ' + _INT_PATTERN + ' THEN round(trim("{c}")::numeric)::integer END'),
+    db.Float: ('double precision',
+               '"{c}" ~ ' + _FLOAT_PATTERN,
+               'CASE WHEN "{c}" ~ ' + _FLOAT_PATTERN + ' THEN trim("{c}")::double precision END'),
+    db.Boolean: ('boolean',
+                 'upper(trim("{c}")) IN ' + _TRUE_LIST + ' OR upper(trim("{c}")) IN ' + _FALSE_LIST,
+                 'CASE WHEN upper(trim("{c}")) IN ' + _TRUE_LIST + ' THEN true '
+                 'WHEN upper(trim("{c}")) IN ' + _FALSE_LIST + ' THEN false END'),
+}
+# Offending rows listed per column before it is converted or skipped
+INVALID_SAMPLE_ROWS = 10
+
+
+def index_is_valid(conn, name):
+    """True if PostgreSQL index ``name`` exists and is usable, False if a
+    failed build left it invalid, None if there is no such index"""
+    return conn.execute(db.text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"), {'name': name}).scalar()
+
+
+def create_index(name, table, definition, unique=False):
+    """Create index ``name`` on ``table`` (``definition`` is the "(...)" or
+    "USING ..." part) unless it already exists; return True if it was built.
+
+    On PostgreSQL the index is built with CREATE INDEX CONCURRENTLY, outside
+    a transaction, so writes to the table carry on meanwhile. An invalid
+    index left behind by an interrupted concurrent build is dropped and
+    rebuilt. Partitioned tables cannot be indexed concurrently; their
+    indexes are built with a plain CREATE INDEX. Concurrent callers building
+    the same index are serialized with an advisory lock.
+    """
+    unique_sql = "UNIQUE " if unique else ""
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if db.engine.dialect.name != 'postgresql':
+            if db.inspect(conn).has_index(table, name):
+                return False
+            conn.exec_driver_sql(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} {definition}')
+            return True
+
+        # Polled rather than waited on: a session blocked in pg_advisory_lock
+        # holds a snapshot, which a concurrent index build would wait for
+        lock = db.text("SELECT pg_try_advisory_lock(hashtext(:name))")
+        while not conn.execute(lock, {'name': name}).scalar():
+            time.sleep(0.5)
+        try:
+            valid = index_is_valid(conn, name)
+            if valid:
+                return False
+            concurrently = "" if table in partitioned_tables(conn) else "CONCURRENTLY "
+            if valid is not None:
+                conn.exec_driver_sql(f'DROP INDEX {concurrently}IF EXISTS {name}')
+            try:
+                conn.exec_driver_sql(
+                    f'CREATE {unique_sql}INDEX {concurrently}IF NOT EXISTS {name} ON {table} {definition}')
+            except DBAPIError:
+                # A failed concurrent build leaves an invalid index behind
+                conn.exec_driver_sql(f'DROP INDEX {concurrently}IF EXISTS {name}')
+                raise
+        finally:
+            conn.execute(db.text("SELECT pg_advisory_unlock(hashtext(:name))"), {'name': name})
+    return True
+
+
+# Indexes dropped by 'flask upgrade-db': (project_id, circuit_id) leads the
+# unique natural-key index of each of these tables, so once that is built
+# the old index only adds write cost
+RETIRED_INDEXES = {
+    f"ix_{table}_project_id_circuit_id": (table, f"ux_{table}_natural_key")
+    for table in ("circuit", "terminal", "group_table", "terminal_header", "choke_table", "resistor_table")
+}
+
+
+def drop_index(name, table, replacement):
+    """Drop index ``name`` of ``table`` once index ``replacement`` is usable;
+    return True if it was dropped.
+
+    PostgreSQL drops it with DROP INDEX CONCURRENTLY (plain DROP INDEX on
+    partitioned tables), so queries and writes are not blocked meanwhile.
+    """
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if db.engine.dialect.name != 'postgresql':
+            inspector = db.inspect(conn)
+            if not inspector.has_index(table, name) or not inspector.has_index(table, replacement):
+                return False
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+            return True
+
+        if index_is_valid(conn, name) is None or not index_is_valid(conn, replacement):
+            return False
+        concurrently = "" if table in partitioned_tables(conn) else "CONCURRENTLY "
+        conn.exec_driver_sql(f'DROP INDEX {concurrently}IF EXISTS {name}')
+    return True
+
+
+def ensure_indexes():
+    """Create any declared sheet-table index that is missing and drop
+    the RETIRED_INDEXES.
+
+    ``db.create_all()`` only creates indexes together with new tables, so
+    databases created before an index was declared get it here. Safe to run
+    repeatedly.
+    """
+    created = []
+    for model in MODEL_MAP.values():
+        table = model.__tablename__
+        for index in model.__table__.indexes:
+            columns = ", ".join(f'"{column.name}"' for column in index.columns)
+            try:
+                if create_index(index.name, table, f"({columns})", unique=index.unique):
+                    created.append(index.name)
+            except IntegrityError:
+                if not index.unique:
+                    raise
+                # Append imports may have stored the same key twice; upserts
+                # fall back to matching keys in Python until they are removed
+                duplicates = _duplicate_keys(table, [column.name for column in index.columns])
+                created.append(f"Skipped {index.name}: {duplicates} keys occur more than once in "
+                               f"{table} (remove the duplicates, e.g. with a sync import, and rerun)")
+    for name, (table, replacement) in RETIRED_INDEXES.items():
+        if drop_index(name, table, replacement):
+            created.append(f"dropped {name} (covered by {replacement})")
+    return created
+
+
+def _duplicate_keys(table, columns):
+    """Number of non-null keys over ``columns`` shared by several rows"""
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    not_null = " AND ".join(f'"{col}" IS NOT NULL' for col in columns)
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql(
+            f'SELECT count(*) FROM (SELECT 1 FROM {table} WHERE {not_null} '
+            f'GROUP BY {column_list} HAVING count(*) > 1) AS duplicates').scalar()
+
+
+def _report_invalid(conn, table, column, valid, count, report):
+    """Pass the first rows of ``column`` that fail ``valid`` to ``report``"""
+    report(f"{table}.{column}: {count} values cannot be converted, e.g.")
+    rows = conn.exec_driver_sql(
+        f'SELECT id, project_id, "{column}" FROM {table} '
+        f'WHERE trim("{column}") <> \'\' AND NOT ({valid}) ORDER BY id LIMIT {INVALID_SAMPLE_ROWS}')
+    for row_id, project_id, value in rows:
+        report(f"  id {row_id} (project {project_id}): {value!r}")
+    if count > INVALID_SAMPLE_ROWS:
+        report(f"  ... and {count - INVALID_SAMPLE_ROWS} more")
+
+
+def convert_typed_columns(coerce_invalid=False, report=print):
+    """Convert legacy text columns to the integer/float/boolean model types.
+
+    PostgreSQL only (SQLite columns are dynamically typed). Columns holding
+    values that cannot be converted are left alone, unless
+    ``coerce_invalid`` is set, in which case those values become NULL.
+    Either way the offending rows are passed to ``report`` before the
+    column is altered or skipped. Returns a list of applied and skipped
+    changes.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return []
+
+    changes = []
+    with db.engine.begin() as conn:
+        inspector = db.inspect(conn)
+        for model in MODEL_MAP.values():
+            table = model.__tablename__
+            db_types = {column['name']: column['type'] for column in inspector.get_columns(table)}
+            for column in model.__table__.columns:
+                conversion = next((spec for sql_type, spec in _CONVERSIONS.items()
+                                   if isinstance(column.type, sql_type)), None)
+                if conversion is None or not isinstance(db_types.get(column.name), db.String):
+                    continue
+                sql_type, valid, using = (part.replace('{c}', column.name) for part in conversion)
+
+                invalid = conn.exec_driver_sql(
+                    f'SELECT count(*) FROM {table} WHERE trim("{column.name}") <> \'\' AND NOT ({valid})'
+                ).scalar()
+                if invalid:
+                    _report_invalid(conn, table, column.name, valid, invalid, report)
+                if invalid and not coerce_invalid:
+                    changes.append(f"Skipped {table}.{column.name}: {invalid} values cannot be converted "
+                                   f"to {sql_type} (fix them or run 'flask upgrade-db --coerce-invalid')")
+                    continue
+
+                conn.exec_driver_sql(
+                    f'ALTER TABLE {table} ALTER COLUMN "{column.name}" TYPE {sql_type} USING {using}')
+                changes.append(f"{table}.{column.name} -> {sql_type}"
+                               + (f" ({invalid} invalid values cleared)" if invalid else ""))
+    return changes
+
+
+def _enable_trigram():
+    """Make sure the pg_trgm extension is installed; return an error or None"""
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").scalar():
+            return None
+        try:
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DBAPIError as e:
+            # Not available on the server, or the role may not create extensions
+            return str(e.orig).strip().splitlines()[0]
+    return None
+
+
+def ensure_search_indexes():
+    """Create the GIN indexes behind sheet search (PostgreSQL).
+
+    Every free-text column gets a full-text index on the same tsvector
+    expression search.py queries. If the pg_trgm extension is installed or
+    can be installed, free-text columns and circuit_id also get trigram
+    indexes, which serve the "contains" and "starts with" column filters;
+    without it those filters still work as unindexed ILIKE scans.
+    """
+    from .search import FULL_TEXT_COLUMNS
+
+    if db.engine.dialect.name != 'postgresql':
+        return []
+
+    created = []
+    trigram_error = _enable_trigram()
+    if trigram_error:
+        created.append(f"Skipped trigram indexes: pg_trgm cannot be enabled ({trigram_error}); "
+                       f"contains/starts-with filters use unindexed ILIKE")
+
+    for sheet_name, text_columns in FULL_TEXT_COLUMNS.items():
+        model = MODEL_MAP[sheet_name]
+        table = model.__tablename__
+        for col in text_columns:
+            name = f"ix_{table}_{col}_fts"
+            if create_index(name, table, f'USING gin (to_tsvector(\'simple\'::regconfig, coalesce("{col}", \'\')))'):
+                created.append(name)
+        if trigram_error:
+            continue
+        trigram_columns = list(text_columns)
+        if 'circuit_id' in model.__table__.c:
+            trigram_columns.append('circuit_id')
+        for col in trigram_columns:
+            name = f"ix_{table}_{col}_trgm"
+            if create_index(name, table, f'USING gin ("{col}" gin_trgm_ops)'):
+                created.append(name)
+    return created
+
+
+def ensure_project_version():
+    """Add the railway_projects.version column to databases created before it existed"""
+    table = Project.__tablename__
+    with db.engine.begin() as conn:
+        if any(column['name'] == 'version' for column in db.inspect(conn).get_columns(table)):
+            return []
+        conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+    return [f"{table}.version added"]
+
+
+def upgrade_database(coerce_invalid=False, report=print):
+    """Apply all idempotent schema upgrades to an existing database.
+
+    Run through ``flask upgrade-db`` only, never at app startup: index
+    builds and column type changes can take a while on large tables and
+    must not race between workers. ``report`` receives details as the
+    upgrade goes (values that block a column conversion).
+    """
+    return (ensure_project_version() + ensure_indexes()
+            + convert_typed_columns(coerce_invalid, report) + ensure_search_indexes())
+
+
+@click.command("upgrade-db")
+@click.option("--coerce-invalid", is_flag=True,
+              help="Clear values that cannot be converted to the typed columns.")
+@with_appcontext
+def upgrade_db_command(coerce_invalid):
+    """Bring an existing database up to the current schema."""
+    changes = upgrade_database(coerce_invalid, report=click.echo)
+    for change in changes:
+        click.echo(f"Applied: {change}" if not change.startswith("Skipped") else change)
+    click.echo(f"Database up to date ({len(changes)} changes)")
@@ -11,6 +11,13 @@ def get_ist_now():
     """Return current datetime in Indian Standard Time"""
     return datetime.now(IST)
 
+def get_ist_wall_time(value=None):
+    """IST wall time without tzinfo (default: now), for naive DateTime comparisons"""
+    value = value or get_ist_now()
+    if value.tzinfo is not None:
+        value = value.astimezone(IST).replace(tzinfo=None)
+    return value
+
 class Project(db.Model):
     __tablename__ = 'railway_projects'
     
@@ -19,12 +26,25 @@ class Project(db.Model):
     description = db.Column(db.Text)
     created_date = db.Column(db.DateTime, default=get_ist_now)
     updated_date = db.Column(db.DateTime, default=get_ist_now, onupdate=get_ist_now)
+    # Bumped by every change to the project's sheets (stats.bump_project_version);
+    # used for ETags and to key cached exports
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     def __repr__(self):
         return f'<Project {self.id}: {self.name}>'
 
 class StationDrawing(db.Model):
     __tablename__ = 'station_drawing'
+    # Sheet tables index (project_id, id), which serves both project filters
+    # and id-ordered listing; existing databases get them via migrations.py.
+    # The unique ux_*_natural_key index is the sheet's key within a project
+    # (schemas.NATURAL_KEYS), used by upsert imports' ON CONFLICT; it also
+    # serves (project_id, circuit_id) lookups, which lead it on every sheet
+    # that has a circuit_id
+    __table_args__ = (
+        db.Index('ix_station_drawing_project_id_id', 'project_id', 'id'),
+        db.Index('ux_station_drawing_natural_key', 'project_id', 'station_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
@@ -47,20 +67,28 @@ class StationDrawing(db.Model):
 
 class JunctionBox(db.Model):
     __tablename__ = 'junction_box'
+    __table_args__ = (
+        db.Index('ix_junction_box_project_id_id', 'project_id', 'id'),
+        db.Index('ux_junction_box_natural_key', 'project_id', 'junction_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
     station_id = db.Column(db.String(100))
     junction_id = db.Column(db.String(100))
     junction_name = db.Column(db.String(200))
-    latitude = db.Column(db.String(100))
-    longitude = db.Column(db.String(100))
-    junction_size = db.Column(db.String(100))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    junction_size = db.Column(db.Integer)
     junction_row = db.Column(db.String(100))
     created_date = db.Column(db.DateTime, default=get_ist_now)
 
 class Circuit(db.Model):
     __tablename__ = 'circuit'
+    __table_args__ = (
+        db.Index('ix_circuit_project_id_id', 'project_id', 'id'),
+        db.Index('ux_circuit_natural_key', 'project_id', 'circuit_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
@@ -68,14 +96,18 @@ class Circuit(db.Model):
     circuit_name = db.Column(db.String(200))
     junction_box = db.Column(db.String(200))
     junction_name = db.Column(db.String(200))
-    row = db.Column(db.String(50))
-    position = db.Column(db.String(50))
+    row = db.Column(db.Integer)
+    position = db.Column(db.Integer)
     terminal = db.Column(db.String(100))
-    start_no = db.Column(db.String(100))
+    start_no = db.Column(db.Integer)
     created_date = db.Column(db.DateTime, default=get_ist_now)
 
 class Terminal(db.Model):
     __tablename__ = 'terminal'
+    __table_args__ = (
+        db.Index('ix_terminal_project_id_id', 'project_id', 'id'),
+        db.Index('ux_terminal_natural_key', 'project_id', 'circuit_id', 'terminal_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
@@ -85,15 +117,19 @@ class Terminal(db.Model):
     symbol = db.Column(db.String(100))
     input_left = db.Column(db.String(200))
     input_right = db.Column(db.String(200))
-    spare = db.Column(db.String(50))
-    input_connected = db.Column(db.String(200))
-    output_connected = db.Column(db.String(200))
+    spare = db.Column(db.Boolean)
+    input_connected = db.Column(db.Boolean)
+    output_connected = db.Column(db.Boolean)
     output_left = db.Column(db.String(200))
     output_right = db.Column(db.String(200))
     created_date = db.Column(db.DateTime, default=get_ist_now)
 
 class Group(db.Model):
     __tablename__ = 'group_table'  # 'group' is reserved in PostgreSQL
+    __table_args__ = (
+        db.Index('ix_group_table_project_id_id', 'project_id', 'id'),
+        db.Index('ux_group_table_natural_key', 'project_id', 'circuit_id', 'group_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
@@ -106,19 +142,27 @@ class Group(db.Model):
 
 class TerminalHeader(db.Model):
     __tablename__ = 'terminal_header'
+    __table_args__ = (
+        db.Index('ix_terminal_header_project_id_id', 'project_id', 'id'),
+        db.Index('ux_terminal_header_natural_key', 'project_id', 'circuit_id', 'header_type', 'terminal_start', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
     circuit_id = db.Column(db.String(100))
     header_type = db.Column(db.String(100))
-    terminal_start = db.Column(db.String(100))
-    terminal_end = db.Column(db.String(100))
+    terminal_start = db.Column(db.Integer)
+    terminal_end = db.Column(db.Integer)
     input_output = db.Column(db.String(100))
     text = db.Column(db.Text)
     created_date = db.Column(db.DateTime, default=get_ist_now)
 
 class ChokeTable(db.Model):
     __tablename__ = 'choke_table'
+    __table_args__ = (
+        db.Index('ix_choke_table_project_id_id', 'project_id', 'id'),
+        db.Index('ux_choke_table_natural_key', 'project_id', 'circuit_id', 'choke_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
@@ -131,6 +175,10 @@ class ChokeTable(db.Model):
 
 class ResistorTable(db.Model):
     __tablename__ = 'resistor_table'
+    __table_args__ = (
+        db.Index('ix_resistor_table_project_id_id', 'project_id', 'id'),
+        db.Index('ux_resistor_table_natural_key', 'project_id', 'circuit_id', 'resistor_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
@@ -140,3 +188,55 @@ class ResistorTable(db.Model):
     output_terminal = db.Column(db.String(100))
     resistor_name = db.Column(db.String(200))
     created_date = db.Column(db.DateTime, default=get_ist_now)
+
+class ProjectStats(db.Model):
+    """Maintained row count per project and sheet, updated by every write path"""
+    __tablename__ = 'project_stats'
+    
+    project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), primary_key=True)
+    sheet_name = db.Column(db.String(50), primary_key=True)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    last_modified = db.Column(db.DateTime, default=get_ist_now, onupdate=get_ist_now)
+
+class ConversionRun(db.Model):
+    """One Excel to PDF conversion: its input, outcome and where the time went"""
+    __tablename__ = 'conversion_runs'
+    __table_args__ = (
+        db.Index('ix_conversion_runs_project_id_created_date', 'project_id', 'created_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('railway_projects.id'), nullable=False)
+    source_name = db.Column(db.String(255))
+    input_hash = db.Column(db.String(64))
+    input_bytes = db.Column(db.BigInteger)
+    pdf_name = db.Column(db.String(100))
+    # success, error or timeout
+    status = db.Column(db.String(20), nullable=False)
+    exit_code = db.Column(db.Integer)
+    page_count = db.Column(db.Integer)
+    junction_count = db.Column(db.Integer)
+    # Wall time of the whole run, and its phases (see conversion_runs.PHASES)
+    duration_seconds = db.Column(db.Float)
+    startup_seconds = db.Column(db.Float)
+    load_seconds = db.Column(db.Float)
+    layout_seconds = db.Column(db.Float)
+    render_seconds = db.Column(db.Float)
+    store_seconds = db.Column(db.Float)
+    peak_memory_kb = db.Column(db.Integer)
+    checksum = db.Column(db.String(32))
+    stderr_summary = db.Column(db.Text)
+    # Naive IST wall time on every backend, so the history windows compare alike
+    created_date = db.Column(db.DateTime, default=get_ist_wall_time)
+
+# Model mapping for dynamic access based on sheet names
+MODEL_MAP = {
+    "StationDrawing": StationDrawing,
+    "junction_box": JunctionBox,
+    "circuit": Circuit,
+    "terminal": Terminal,
+    "group": Group,
+    "terminal_header": TerminalHeader,
+    "choketable": ChokeTable,
+    "resistortable": ResistorTable,
+}
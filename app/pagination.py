@@ -0,0 +1,65 @@
+from sqlalchemy import cast, false
+from .models import db
+from .coercion import parse_bool
+
+# Defaults for keyset-paginated sheet listings
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def page_size(value, default=None):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        size = default or DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def apply_filters(query, model, columns, filters):
+    """Restrict ``query`` to rows whose columns contain the filter values.
+
+    ``filters`` maps column names to search text; unknown columns and blank
+    values are ignored. Text matching is case insensitive, numbers match on
+    their text form and Y/N flags match exactly.
+    """
+    for col, value in filters.items():
+        if col not in columns or not value:
+            continue
+        column = getattr(model, col)
+        if isinstance(column.type, db.Boolean):
+            try:
+                query = query.filter(column == parse_bool(value))
+            except ValueError:
+                query = query.filter(false())
+        elif isinstance(column.type, db.String):
+            query = query.filter(column.icontains(value, autoescape=True))
+        else:
+            query = query.filter(cast(column, db.String).icontains(value, autoescape=True))
+    return query
+
+
+def keyset_page(query, model, after=None, before=None, per_page=DEFAULT_PAGE_SIZE, order_key=None):
+    """Fetch one page of ``query`` ordered by id using keyset pagination.
+
+    Pages are addressed by the last id of the previous page (``after``) or
+    the first id of the next page (``before``), so the cost of a page does
+    not depend on how deep it is. ``order_key`` replaces ``model.id`` in the
+    ORDER BY (e.g. ``model.id + 0`` to keep the planner off the primary key
+    when a selective index should drive the query). Returns
+    (rows, has_prev, has_next).
+    """
+    order_key = model.id if order_key is None else order_key
+    if before is not None:
+        rows = (query.filter(model.id < before)
+                .order_by(order_key.desc()).limit(per_page + 1).all())
+        has_prev = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        return rows, has_prev, True
+
+    if after is not None:
+        query = query.filter(model.id > after)
+    rows = query.order_by(order_key).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    return rows[:per_page], after is not None, has_next
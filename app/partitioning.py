@@ -0,0 +1,126 @@
+import click
+from flask.cli import with_appcontext
+from .models import db, Project, MODEL_MAP
+
+# PostgreSQL LIST partitioning of the sheet tables by project_id. Each
+# project gets its own partition (<table>_p<project_id>) plus a DEFAULT
+# partition per table for rows of projects without one. Per-project queries
+# filter on project_id so the planner prunes to a single partition, and
+# clearing a project is a TRUNCATE instead of a large DELETE.
+SHEET_TABLES = [model.__tablename__ for model in MODEL_MAP.values()]
+
+
+def partition_name(table, project_id):
+    return f"{table}_p{int(project_id)}"
+
+
+def partitioned_tables(conn=None):
+    """Return the set of sheet tables that are partitioned in the database"""
+    if db.engine.dialect.name != 'postgresql':
+        return set()
+    conn = conn or db.session
+    rows = conn.execute(db.text(
+        "SELECT c.relname FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE pg_table_is_visible(c.oid)"
+    ))
+    return {name for name, in rows} & set(SHEET_TABLES)
+
+
+def _existing_partitions(project_id, tables):
+    """Return the subset of ``tables`` that have a partition for the project"""
+    names = {partition_name(table, project_id): table for table in tables}
+    if not names:
+        return set()
+    rows = db.session.execute(
+        db.text("SELECT relname FROM pg_class WHERE relname = ANY(:names) AND pg_table_is_visible(oid)"),
+        {'names': list(names)})
+    return {names[name] for name, in rows}
+
+
+def ensure_project_partitions(project_id):
+    """Create the project's partitions on every partitioned sheet table.
+
+    Runs in the caller's transaction; a no-op when the tables are not
+    partitioned (or on SQLite).
+    """
+    for table in sorted(partitioned_tables()):
+        db.session.execute(db.text(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(table, project_id)}" '
+            f'PARTITION OF "{table}" FOR VALUES IN ({int(project_id)})'))
+
+
+def truncate_project_partitions(project_id):
+    """TRUNCATE the project's partitions and return the tables handled.
+
+    Tables that are not partitioned, or whose rows for this project live in
+    the DEFAULT partition, are not in the result and still need a DELETE.
+    """
+    tables = _existing_partitions(project_id, partitioned_tables())
+    if tables:
+        names = ", ".join(f'"{partition_name(table, project_id)}"' for table in sorted(tables))
+        db.session.execute(db.text(f"TRUNCATE {names}"))
+    return tables
+
+
+def partition_sheet_tables():
+    """Convert the plain sheet tables to LIST partitioning by project_id.
+
+    PostgreSQL only. Each table is rebuilt in one transaction: the old table
+    is renamed, a partitioned copy with a DEFAULT partition and one partition
+    per existing project is created, rows are copied across and the old
+    table dropped. The primary key becomes (id, project_id) because a
+    partitioned table's unique constraints must include the partition key;
+    the id sequence is kept so ids continue where they left off. Already
+    partitioned tables are skipped. Returns the converted table names.
+    """
+    from .migrations import ensure_indexes, ensure_search_indexes
+
+    if db.engine.dialect.name != 'postgresql':
+        return []
+
+    converted = []
+    project_ids = [pid for pid, in db.session.query(Project.id)]
+    db.session.commit()
+    with db.engine.begin() as conn:
+        done = partitioned_tables(conn)
+        for table in SHEET_TABLES:
+            if table in done:
+                continue
+            old = f"{table}_unpartitioned"
+            sequence = conn.exec_driver_sql(f"SELECT pg_get_serial_sequence('{table}', 'id')").scalar()
+
+            conn.exec_driver_sql(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+            conn.exec_driver_sql(
+                f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY LIST (project_id)')
+            conn.exec_driver_sql(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+            for project_id in project_ids:
+                conn.exec_driver_sql(
+                    f'CREATE TABLE "{partition_name(table, project_id)}" '
+                    f'PARTITION OF "{table}" FOR VALUES IN ({int(project_id)})')
+            conn.exec_driver_sql(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+            if sequence:
+                conn.exec_driver_sql(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id')
+            conn.exec_driver_sql(f'DROP TABLE "{old}"')
+            conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, project_id)')
+            conn.exec_driver_sql(
+                f'ALTER TABLE "{table}" ADD FOREIGN KEY (project_id) REFERENCES railway_projects (id)')
+            converted.append(table)
+
+    # Indexes created on the partitioned parent cascade to every partition
+    ensure_indexes()
+    ensure_search_indexes()
+    return converted
+
+
+@click.command("partition-tables")
+@with_appcontext
+def partition_tables_command():
+    """Partition the sheet tables by project (PostgreSQL)."""
+    if db.engine.dialect.name != 'postgresql':
+        click.echo("Partitioning needs PostgreSQL; nothing to do")
+        return
+    converted = partition_sheet_tables()
+    for table in converted:
+        click.echo(f"Partitioned: {table}")
+    click.echo(f"Sheet tables partitioned by project ({len(converted)} converted)")
@@ -1,26 +1,31 @@
-import os,subprocess,io
-from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, send_file, flash, session
+import os,subprocess,io,time,csv,hashlib,shutil,tempfile
+from flask import Blueprint, render_template, request, redirect, url_for, send_file, flash, session, current_app, jsonify, Response
 from werkzeug.utils import secure_filename
-from openpyxl import Workbook, load_workbook
-from .models import (db, Project, StationDrawing, JunctionBox, Circuit, 
-                     Terminal, Group, TerminalHeader, ChokeTable, ResistorTable, get_ist_now)
-from .schemas import SHEETS, HEADER_HINTS
+from werkzeug.http import is_resource_modified
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from .models import db, Project, get_ist_now, IST, MODEL_MAP
+from .schemas import SHEETS, HEADER_HINTS, NATURAL_KEYS
+from .stats import project_stats, init_project_stats, adjust_row_counts, reset_row_counts
+from .coercion import coerce_data, format_value
+from .pagination import page_size, apply_filters, keyset_page
+from .partitioning import ensure_project_partitions, truncate_project_partitions
+from .cloning import clone_project
+from .batch import apply_row_batch
+from .search import search_sheet, search_project
+from .artifacts import (store_stream, store_file, temp_path, artifact_name, artifact_path,
+                        remove_artifact)
+from .metrics import observe_upload, observe_conversion
+from .circuit_svg import circuit_svg, circuit_ids_for
+from .thumbnails import start_thumbnails, thumbnail_status
+from .conversion_runs import (parse_run_stats, output_summary, record_conversion, recent_runs,
+                              duration_trends, PHASES, DEFAULT_WINDOW_DAYS, RECENT_DAYS)
+from .junction_pdfs import junction_pdfs, junction_filename, store_junction_pdfs, stream_junction_zip
+from .exporter import cached_project_xlsx, export_project_archive
+from .importer import (WorkbookReader, find_sheet, sheet_records, workbook_records, archive_records,
+                       import_records, describe_counts, IMPORT_MODES)
 
 bp = Blueprint("main", __name__)
 
-# Model mapping for dynamic access based on sheet names
-MODEL_MAP = {
-    "StationDrawing": StationDrawing,
-    "junction_box": JunctionBox,
-    "circuit": Circuit,
-    "terminal": Terminal,
-    "group": Group,
-    "terminal_header": TerminalHeader,
-    "choketable": ChokeTable,
-    "resistortable": ResistorTable,
-}
-
 def get_current_project():
     """Get current project from session WITHOUT auto-creating"""
     if 'project_id' not in session:
@@ -36,6 +41,33 @@ def get_current_project():
     
     return project_id
 
+def project_last_modified(project):
+    """Project.updated_date as an aware datetime (naive values are IST, see get_ist_now)"""
+    updated = project.updated_date
+    if updated is not None and updated.tzinfo is None:
+        updated = updated.replace(tzinfo=IST)
+    return updated
+
+def project_etag(project, view):
+    return f"{view}-{project.id}-v{project.version}"
+
+def project_not_modified(project, view):
+    """A 304 response if the client's copy of ``view`` matches the project's version, else None"""
+    if not is_resource_modified(request.environ, etag=project_etag(project, view),
+                                last_modified=project_last_modified(project)):
+        response = current_app.response_class(status=304)
+        return set_project_validators(response, project, view)
+    return None
+
+def set_project_validators(response, project, view):
+    """Tag a response for a project view with its version ETag and Last-Modified"""
+    response.set_etag(project_etag(project, view))
+    response.last_modified = project_last_modified(project)
+    # Always revalidate; unchanged projects then cost a 304
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
 def allowed_file(filename):
     """Check if uploaded file has allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'xlsx'
@@ -51,13 +83,9 @@ def index():
     
     current_project = Project.query.get(project_id)
     
-    # Get row counts for each sheet
-    table_counts = {}
-    total_rows = 0
-    for sheet_name, model in MODEL_MAP.items():
-        count = model.query.filter_by(project_id=project_id).count()
-        table_counts[sheet_name] = count
-        total_rows += count
+    # Get row counts for each sheet from the maintained summary table
+    table_counts = project_stats([project_id])[project_id][0]
+    total_rows = sum(table_counts.values())
     
     return render_template("index.html", 
                          tables=table_counts, 
@@ -69,17 +97,15 @@ def project_selection():
     """Project selection page - shows existing projects and create new option"""
     projects = Project.query.order_by(Project.created_date.desc()).all()
     
-    # Get row counts for each project
+    # Get row counts for all projects from the maintained summary table
+    stats = project_stats([project.id for project in projects])
     projects_data = []
     for project in projects:
-        total_rows = 0
-        for sheet_name, model in MODEL_MAP.items():
-            count = model.query.filter_by(project_id=project.id).count()
-            total_rows += count
-        
+        table_counts, last_modified = stats[project.id]
         projects_data.append({
             'project': project,
-            'total_rows': total_rows,
+            'total_rows': sum(table_counts.values()),
+            'last_modified': last_modified,
         })
     
     return render_template("project_selection.html", projects_data=projects_data)
@@ -117,91 +143,40 @@ def upload_sheet(sheet_name):
             flash('Only XLSX files are allowed')
             return redirect(request.url)
         
+        observe_upload("sheet", request.content_length)
+        reader = None
         try:
-            # Load the workbook directly from memory
-            wb = load_workbook(file, data_only=True)
+            # Read from the spooled upload; only the matching sheet is parsed
+            reader = WorkbookReader(file.stream, current_app.config.get("IMPORT_CALAMINE_MAX_BYTES"))
             
             # Try to find sheet with matching name (case insensitive)
-            sheet_found = None
-            for ws_name in wb.sheetnames:
-                if ws_name.lower() == sheet_name.lower():
-                    sheet_found = ws_name
-                    break
+            sheet_found = find_sheet(reader.sheetnames, sheet_name)
             
             if not sheet_found:
-                flash(f'No "{sheet_name}" sheet found in the uploaded file. Available sheets: {", ".join(wb.sheetnames)}')
+                flash(f'No "{sheet_name}" sheet found in the uploaded file. Available sheets: {", ".join(reader.sheetnames)}')
                 return redirect(request.url)
             
-            ws = wb[sheet_found]
-            
-            # Get headers from first row
-            headers = []
-            for cell in ws[1]:
-                if cell.value:
-                    headers.append(str(cell.value).strip().lower())
-                else:
-                    headers.append('')
-            
-            # Check if required headers are present (case insensitive)
-            missing_headers = []
-            header_mapping = {}
-            for required_header in expected_headers:
-                found = False
-                for i, file_header in enumerate(headers):
-                    if file_header == required_header.lower():
-                        header_mapping[required_header] = i
-                        found = True
-                        break
-                if not found:
-                    missing_headers.append(required_header)
+            import_errors = []
+            records, missing_headers = sheet_records(reader, sheet_found, sheet_name, import_errors)
             
             if missing_headers:
                 flash(f'Missing required columns: {", ".join(missing_headers)}')
                 return redirect(request.url)
             
-            # Process rows and import data
-            imported_count = 0
-            error_count = 0
-            
-            # Start from row 2 (skip header)
-            for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                try:
-                    # Create data dictionary
-                    data = {'project_id': project_id}
-                    
-                    # Map row values to expected headers
-                    for header in expected_headers:
-                        if header in header_mapping:
-                            col_index = header_mapping[header]
-                            # Get cell value, convert to string and handle None
-                            cell_value = row[col_index] if col_index < len(row) else None
-                            if cell_value is not None:
-                                data[header] = str(cell_value).strip() if str(cell_value).strip() else None
-                            else:
-                                data[header] = None
-                        else:
-                            data[header] = None
-                    
-                    # Check if row has any data (not all None)
-                    has_data = any(data[col] for col in expected_headers if data.get(col))
-                    
-                    if has_data:
-                        # Create record for this sheet
-                        record = model(**data)
-                        db.session.add(record)
-                        imported_count += 1
-                        
-                except Exception as e:
-                    error_count += 1
-                    print(f"Error processing row {row_num}: {str(e)}")
-                    continue
+            # Convert and insert the remaining rows chunk by chunk as they are read
+            started = time.perf_counter()
+            counts = import_records(model, expected_headers, project_id, records,
+                                    mode=request.form.get('mode', 'append'),
+                                    chunk_size=current_app.config.get("IMPORT_CHUNK_SIZE"),
+                                    commit_rows=current_app.config.get("IMPORT_COMMIT_ROWS"))
+            elapsed = time.perf_counter() - started
+            processed = counts['inserted'] + counts['updated']
+            flash_import_errors(import_errors)
             
-            # Commit all changes
-            if imported_count > 0:
-                db.session.commit()
-                flash(f'Successfully imported {imported_count} {sheet_name} records to Project ID {project_id}')
-                if error_count > 0:
-                    flash(f'Warning: {error_count} rows had errors and were skipped')
+            if processed or counts['deleted']:
+                rate = processed / elapsed if elapsed > 0 else processed
+                flash(f'Successfully imported {describe_counts(counts)} for {sheet_name} in Project ID {project_id} '
+                      f'in {elapsed:.2f}s ({rate:,.0f} rows/s)')
                 return redirect(url_for("main.sheet_form", name=sheet_name))
             else:
                 flash('No valid data found to import')
@@ -211,15 +186,184 @@ def upload_sheet(sheet_name):
             db.session.rollback()
             flash(f'Error processing file: {str(e)}')
             return redirect(request.url)
+        finally:
+            if reader is not None:
+                reader.close()
     
     # GET request - show upload form
     return render_template("upload_sheet.html", 
                          current_project=current_project,
                          sheet_name=sheet_name,
                          expected_headers=expected_headers,
+                         import_modes=IMPORT_MODES,
+                         natural_key=NATURAL_KEYS[sheet_name],
                          sheet_display_name=sheet_name.replace('_', ' ').title(),
                          hint=HEADER_HINTS.get(sheet_name, f"Upload {sheet_name} data from XLSX file"))
 
+# Whole-project import formats: (file extension, label)
+IMPORT_FORMATS = {
+    "xlsx": (".xlsx", "XLSX workbook"),
+    "csv": (".zip", "zipped CSV files"),
+    "parquet": (".zip", "zipped Parquet files"),
+}
+
+# Columns of the downloadable import error report
+IMPORT_REPORT_COLUMNS = ("sheet", "row", "column", "value", "message")
+
+def flash_import_errors(errors, limit=5):
+    """Summarize skipped rows and keep the full error report for download.
+    
+    Each value that could not be converted to its column type is one line
+    of a CSV report stored in the artifact store; the page that renders
+    next shows a link to it (see import_report).
+    """
+    if not errors:
+        return
+    rows = {(error['sheet'], error['row']) for error in errors}
+    flash(f'Warning: {len(rows)} rows were skipped because {len(errors)} values could not be converted')
+    by_column = {}
+    for error in errors:
+        by_column.setdefault((error['sheet'], error['column']), []).append(error)
+    for (sheet, column), column_errors in sorted(by_column.items(), key=lambda item: -len(item[1]))[:limit]:
+        first = column_errors[0]
+        flash(f"{sheet}.{column}: {len(column_errors)} bad values, first at row {first['row']} ({first['message']})")
+    if len(by_column) > limit:
+        flash(f'... and {len(by_column) - limit} more columns with bad values')
+    
+    report = io.StringIO()
+    writer = csv.DictWriter(report, fieldnames=IMPORT_REPORT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(errors)
+    name, _ = store_stream(io.BytesIO(report.getvalue().encode('utf-8')), 'csv')
+    session['import_report'] = {'name': name, 'errors': len(errors), 'rows': len(rows)}
+
+@bp.app_context_processor
+def import_report_context():
+    def import_report():
+        """The pending import error report, shown once"""
+        return session.pop('import_report', None)
+    return {'import_report': import_report}
+
+@bp.route("/import_report/<name>")
+def download_import_report(name):
+    """Download the CSV report of values rejected by an import"""
+    path = artifact_path(name)
+    if not path or not name.endswith('.csv'):
+        flash('Import report not found (reports are kept for a limited time)')
+        return redirect(url_for('main.index'))
+    return send_file(path, as_attachment=True, download_name='import_errors.csv', mimetype='text/csv')
+
+def import_all_sheets(project_id, sheet_iter, mode="append", errors=None):
+    """Import every (sheet_name, records, missing_headers) in one transaction.
+    
+    Flashes per-sheet counts, skipped sheets and conversion ``errors``
+    (filled while ``sheet_iter`` is consumed); returns True if anything
+    was changed.
+    """
+    started = time.perf_counter()
+    sheet_counts = {}
+    skipped = []
+    for sheet_name, records, missing_headers in sheet_iter:
+        if missing_headers:
+            skipped.append(f'{sheet_name} (missing: {", ".join(missing_headers)})')
+            continue
+        sheet_counts[sheet_name] = import_records(
+            MODEL_MAP[sheet_name], SHEETS[sheet_name], project_id, records, mode=mode,
+            chunk_size=current_app.config.get("IMPORT_CHUNK_SIZE"), commit=False)
+    
+    processed = sum(counts['inserted'] + counts['updated'] for counts in sheet_counts.values())
+    deleted = sum(counts['deleted'] for counts in sheet_counts.values())
+    if not processed and not deleted:
+        db.session.rollback()
+        flash('No valid data found to import')
+    else:
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed > 0 else processed
+        flash(f'Successfully imported {processed} records from {len(sheet_counts)} sheets to Project ID {project_id} '
+              f'in {elapsed:.2f}s ({rate:,.0f} rows/s)')
+        for sheet_name, counts in sheet_counts.items():
+            flash(f'{sheet_name}: {describe_counts(counts)}')
+    for sheet in skipped:
+        flash(f'Skipped sheet {sheet}')
+    flash_import_errors(errors)
+    return bool(processed or deleted)
+
+@bp.route("/upload_workbook", methods=["GET", "POST"])
+@bp.route("/import/<fmt>", methods=["GET", "POST"])
+def upload_workbook(fmt="xlsx"):
+    """Import every recognized sheet of one upload (XLSX, zipped CSV or Parquet) in a single transaction"""
+    if fmt not in IMPORT_FORMATS:
+        flash(f"Unknown import format: {fmt}")
+        return redirect(url_for("main.index"))
+    
+    project_id = get_current_project()
+    if not project_id:
+        return redirect(url_for("main.project_selection"))
+    
+    current_project = Project.query.get(project_id)
+    extension, label = IMPORT_FORMATS[fmt]
+    
+    if request.method == "POST":
+        file = request.files.get('file')
+        if not file or file.filename == '':
+            flash('No file selected')
+            return redirect(request.url)
+        
+        if not file.filename.lower().endswith(extension):
+            flash(f'Only {extension} files are allowed for {label}')
+            return redirect(request.url)
+        
+        observe_upload(f"workbook_{fmt}", request.content_length)
+        try:
+            # The upload is read once; each recognized sheet goes through the bulk path
+            import_errors = []
+            if fmt == "xlsx":
+                sheet_iter = workbook_records(
+                    file.stream, SHEETS, errors=import_errors,
+                    calamine_max_bytes=current_app.config.get("IMPORT_CALAMINE_MAX_BYTES"))
+            else:
+                sheet_iter = archive_records(file.stream, fmt, SHEETS, errors=import_errors)
+            
+            if import_all_sheets(project_id, sheet_iter, mode=request.form.get('mode', 'append'),
+                                 errors=import_errors):
+                return redirect(url_for("main.index"))
+            return redirect(request.url)
+        
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error processing file: {str(e)}')
+            return redirect(request.url)
+    
+    return render_template("upload_workbook.html", current_project=current_project,
+                           fmt=fmt, extension=extension, label=label, import_modes=IMPORT_MODES)
+
+@bp.route("/export/<fmt>")
+def export_archive(fmt):
+    """Download every sheet of the project as zipped CSV or Parquet files"""
+    project_id = get_current_project()
+    if not project_id:
+        flash("Please select a project first")
+        return redirect(url_for("main.project_selection"))
+    
+    if fmt not in ("csv", "parquet"):
+        flash(f"Unknown export format: {fmt}")
+        return redirect(url_for("main.index"))
+    
+    current_project = Project.query.get(project_id)
+    not_modified = project_not_modified(current_project, fmt)
+    if not_modified:
+        return not_modified
+    try:
+        archive_file = export_project_archive(project_id, fmt, current_app.config.get("EXPORT_FETCH_SIZE"))
+    except RuntimeError as e:
+        flash(str(e))
+        return redirect(url_for("main.index"))
+    
+    filename = f"RAILWAYPROJECT_ID{project_id}_{current_project.name}_{get_ist_now().strftime('%Y%m%d_%H%M%S')}_{fmt}.zip"
+    response = send_file(archive_file, as_attachment=True, download_name=filename, mimetype="application/zip")
+    return set_project_validators(response, current_project, fmt)
+
 @bp.route("/sheet/<name>", methods=["GET", "POST"])
 def sheet_form(name):
     """Handle form for individual sheets - add/edit/display"""
@@ -252,41 +396,63 @@ def sheet_form(name):
             data[col] = value if value else None
         
         # Check if at least one field has data
-        if any(data.values()):
+        if any(value is not None for value in data.values()):
+            data, errors = coerce_data(name, data)
+            if errors:
+                for error in errors:
+                    flash(f"{error['column']}: {error['message']}")
+                return redirect(url_for("main.sheet_form", name=name, edit=edit_id))
             data['project_id'] = project_id
             
-            if edit_id and edit_row:
-                # Update existing row
-                for col, val in data.items():
-                    if hasattr(edit_row, col):
-                        setattr(edit_row, col, val)
-                flash(f"Row updated in {name} for Project ID {project_id}")
-            else:
-                # Create new row
-                try:
-                    new_record = model(**data)
-                    db.session.add(new_record)
-                    flash(f"Row added to {name} for Project ID {project_id}")
-                except Exception as e:
-                    flash(f"Error adding row: {str(e)}")
-                    db.session.rollback()
-                    return redirect(url_for("main.sheet_form", name=name))
-            
-            db.session.commit()
+            try:
+                if edit_id and edit_row:
+                    # Update existing row
+                    for col, val in data.items():
+                        if hasattr(edit_row, col):
+                            setattr(edit_row, col, val)
+                    adjust_row_counts(project_id, {name: 0})
+                    message = f"Row updated in {name} for Project ID {project_id}"
+                else:
+                    # Create new row
+                    db.session.add(model(**data))
+                    adjust_row_counts(project_id, {name: 1})
+                    message = f"Row added to {name} for Project ID {project_id}"
+                db.session.commit()
+            except IntegrityError:
+                # The natural key is unique within a project (ux_<table>_natural_key)
+                db.session.rollback()
+                flash(f"Another {name} row in this project already has this "
+                      f"({', '.join(NATURAL_KEYS[name])}); change it or edit that row instead")
+                return redirect(url_for("main.sheet_form", name=name, edit=edit_id))
+            except Exception as e:
+                db.session.rollback()
+                flash(f"Error saving row: {str(e)}")
+                return redirect(url_for("main.sheet_form", name=name, edit=edit_id))
+            flash(message)
         else:
             flash("Please fill at least one field")
             
         return redirect(url_for("main.sheet_form", name=name))
     
-    # GET request - display form and existing data
-    rows = model.query.filter_by(project_id=project_id).order_by(model.id).all()
+    # GET request - display form and one keyset page of existing data
+    per_page = page_size(request.args.get('per_page'), current_app.config.get("SHEET_PAGE_SIZE"))
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    filters = {col: request.args.get(f'f_{col}', '').strip() for col in columns}
+    filters = {col: value for col, value in filters.items() if value}
+    
+    query = apply_filters(model.query.filter_by(project_id=project_id), model, columns, filters)
+    rows, has_prev, has_next = keyset_page(query, model, after=after, before=before, per_page=per_page)
+    
+    # Unfiltered total comes from the maintained summary, not a COUNT(*)
+    total_rows = None if filters else project_stats([project_id])[project_id][0][name]
     
     # Convert SQLAlchemy objects to dictionaries for easier template access
     rows_data = []
     for row in rows:
         row_dict = {}
         for col in columns:
-            row_dict[col] = getattr(row, col, '')
+            row_dict[col] = format_value(getattr(row, col, ''))
         row_dict['id'] = row.id  # Keep the ID for edit/delete
         rows_data.append(row_dict)
     
@@ -295,7 +461,7 @@ def sheet_form(name):
     if edit_row:
         edit_row_dict = {}
         for col in columns:
-            edit_row_dict[col] = getattr(edit_row, col, '')
+            edit_row_dict[col] = format_value(getattr(edit_row, col, ''))
     
     return render_template("sheet_form.html",
                          sheet=name, 
@@ -305,6 +471,12 @@ def sheet_form(name):
                          edit_id=edit_id,
                          edit_row=edit_row_dict,
                          current_project=current_project,
+                         total_rows=total_rows,
+                         filters=filters,
+                         filter_args={f'f_{col}': value for col, value in filters.items()},
+                         per_page=per_page,
+                         has_prev=has_prev,
+                         has_next=has_next,
                          show_upload=True)  # Show upload button for ALL sheets
 
 # ... (rest of the existing routes remain the same - delete_row, edit_row, preview, download, etc.)
@@ -325,6 +497,7 @@ def delete_row(name, row_id):
     if record:
         try:
             db.session.delete(record)
+            adjust_row_counts(project_id, {name: -1})
             db.session.commit()
             flash(f"Row deleted successfully from {name} (Project ID: {project_id})")
         except Exception as e:
@@ -335,6 +508,217 @@ def delete_row(name, row_id):
     
     return redirect(url_for("main.sheet_form", name=name))
 
+@bp.route("/api/sheet/<name>/rows", methods=["POST"])
+def sheet_rows_api(name):
+    """Apply a JSON batch of inserts, updates and deletes to a sheet.
+
+    Body: {"insert": [{col: value}], "update": [{"id": n, col: value}],
+    "delete": [id, ...], "partial": false}. The project is the ``project_id``
+    query argument or the session's current project.
+    """
+    if name not in MODEL_MAP:
+        return jsonify({'error': f"Unknown sheet: {name}"}), 404
+    
+    project_id = request.args.get('project_id', type=int) or get_current_project()
+    if not project_id or not db.session.get(Project, project_id):
+        return jsonify({'error': "No such project"}), 404
+    
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not all(
+            isinstance(payload.get(key, []), list) for key in ('insert', 'update', 'delete')):
+        return jsonify({'error': "Expected a JSON object with insert, update and delete lists"}), 400
+    
+    try:
+        applied, results = apply_row_batch(name, project_id,
+                                           inserts=payload.get('insert', []),
+                                           updates=payload.get('update', []),
+                                           deletes=payload.get('delete', []),
+                                           partial=bool(payload.get('partial')))
+    except IntegrityError as e:
+        # Rows written earlier in the batch took a key a later row needed
+        print(f"Batch on {name} rejected by a constraint: {e.orig}")
+        return jsonify({'error': f"The batch conflicts with a unique key of the {name} rows; nothing was saved"}), 409
+    except SQLAlchemyError as e:
+        print(f"Batch on {name} failed: {e}")
+        return jsonify({'error': "Database error applying batch; nothing was saved"}), 500
+    except Exception as e:
+        return jsonify({'error': f"Error applying batch: {str(e)}"}), 500
+    
+    counts = {status: sum(1 for entries in results.values() for result in entries if result['status'] == status)
+              for status in ('inserted', 'updated', 'deleted', 'error')}
+    return jsonify({'applied': applied, 'project_id': project_id, 'sheet': name,
+                    'counts': counts, 'results': results}), 200 if applied else 422
+
+# Rows per request made by the preview page
+PREVIEW_CHUNK_SIZE = 200
+
+@bp.route("/api/sheet/<name>/rows", methods=["GET"])
+def sheet_rows_page_api(name):
+    """One chunk of a sheet's rows as display text, in id order.
+    
+    The chunk starts after row id ``after`` (keyset, cheap at any depth)
+    or, for a jump into the middle of the sheet, at row number ``offset``.
+    Rows are [id, value, ...] lists in the order of ``columns``.
+    """
+    if name not in MODEL_MAP:
+        return jsonify({'error': f"Unknown sheet: {name}"}), 404
+    
+    project_id = request.args.get('project_id', type=int) or get_current_project()
+    project = db.session.get(Project, project_id) if project_id else None
+    if not project:
+        return jsonify({'error': "No such project"}), 404
+    # One ETag per chunk request: the query string is part of the view
+    view = f"rows-{name}-{hashlib.sha256(request.query_string).hexdigest()[:16]}"
+    not_modified = project_not_modified(project, view)
+    if not_modified:
+        return not_modified
+    
+    model = MODEL_MAP[name]
+    columns = SHEETS[name]
+    limit = page_size(request.args.get('limit'), PREVIEW_CHUNK_SIZE)
+    after = request.args.get('after', type=int)
+    offset = request.args.get('offset', type=int)
+    # Only the displayed columns are selected; no ORM objects are built
+    query = db.session.query(model.id, *[getattr(model, col) for col in columns]).filter(
+        model.project_id == project_id)
+    
+    if after is None and offset:
+        # Turn the offset into a keyset cursor: the id of the row just before it
+        after = (query.with_entities(model.id).order_by(model.id)
+                 .offset(offset - 1).limit(1).scalar())
+        if after is None:
+            return set_project_validators(jsonify({'sheet': name, 'columns': columns, 'rows': [],
+                                                   'has_next': False, 'next_after': None}), project, view)
+    
+    rows, _, has_next = keyset_page(query, model, after=after, per_page=limit)
+    return set_project_validators(jsonify({
+        'sheet': name, 'columns': columns,
+        'rows': [[row[0]] + [format_value(value) for value in row[1:]] for row in rows],
+        'has_next': has_next,
+        'next_after': rows[-1][0] if rows and has_next else None}), project, view)
+
+def search_args(columns):
+    """Read q, f_<col> (contains) and p_<col> (starts with) search arguments"""
+    q = request.args.get('q', '').strip()
+    filters = {col: request.args.get(f'f_{col}', '').strip() for col in columns}
+    prefixes = {col: request.args.get(f'p_{col}', '').strip() for col in columns}
+    return (q, {col: value for col, value in filters.items() if value},
+            {col: value for col, value in prefixes.items() if value})
+
+def run_search(project_id):
+    """Run the search described by the request arguments.
+
+    With ``sheet`` the result is one keyset page of that sheet; without it,
+    the first page of free-text matches from every searchable sheet.
+    Returns (sheet_name, q, filters, prefixes, per_page, results) where
+    results is {sheet_name: (rows, has_prev, has_next)}.
+    """
+    sheet_name = request.args.get('sheet', '')
+    per_page = page_size(request.args.get('per_page'), current_app.config.get("SHEET_PAGE_SIZE"))
+    if sheet_name in SHEETS:
+        q, filters, prefixes = search_args(SHEETS[sheet_name])
+        page = search_sheet(sheet_name, project_id, q=q, filters=filters, prefixes=prefixes,
+                            after=request.args.get('after', type=int),
+                            before=request.args.get('before', type=int), per_page=per_page)
+        return sheet_name, q, filters, prefixes, per_page, {sheet_name: page}
+    
+    q = request.args.get('q', '').strip()
+    results = {}
+    if q:
+        for name, (rows, has_next) in search_project(project_id, q, per_page=per_page).items():
+            results[name] = (rows, False, has_next)
+    return None, q, {}, {}, per_page, results
+
+@bp.route("/search")
+def search():
+    """Search the current project's sheets"""
+    project_id = get_current_project()
+    if not project_id:
+        return redirect(url_for("main.project_selection"))
+    
+    current_project = Project.query.get(project_id)
+    start = time.perf_counter()
+    sheet_name, q, filters, prefixes, per_page, results = run_search(project_id)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    results_data = {}
+    for name, (rows, has_prev, has_next) in results.items():
+        rows_data = []
+        for row in rows:
+            row_dict = {col: format_value(getattr(row, col, '')) for col in SHEETS[name]}
+            row_dict['id'] = row.id
+            rows_data.append(row_dict)
+        results_data[name] = {'rows': rows_data, 'has_prev': has_prev, 'has_next': has_next}
+    
+    search_params = {'q': q, 'per_page': per_page}
+    search_params.update({f'f_{col}': value for col, value in filters.items()})
+    search_params.update({f'p_{col}': value for col, value in prefixes.items()})
+    
+    return render_template("search.html",
+                         current_project=current_project,
+                         sheet=sheet_name,
+                         q=q,
+                         filters=filters,
+                         prefixes=prefixes,
+                         per_page=per_page,
+                         results=results_data,
+                         search_params=search_params,
+                         elapsed_ms=elapsed_ms)
+
+@bp.route("/api/search")
+def search_api():
+    """JSON search of a project's sheets (same arguments as /search)"""
+    project_id = request.args.get('project_id', type=int) or get_current_project()
+    if not project_id or not db.session.get(Project, project_id):
+        return jsonify({'error': "No such project"}), 404
+    
+    sheet_name, q, filters, prefixes, per_page, results = run_search(project_id)
+    sheets = {}
+    for name, (rows, has_prev, has_next) in results.items():
+        rows_data = []
+        for row in rows:
+            row_dict = {'id': row.id}
+            row_dict.update({col: getattr(row, col) for col in SHEETS[name]})
+            rows_data.append(row_dict)
+        sheets[name] = {'rows': rows_data, 'has_prev': has_prev, 'has_next': has_next,
+                        'next_after': rows[-1].id if rows and has_next else None,
+                        'prev_before': rows[0].id if rows and has_prev else None}
+    return jsonify({'project_id': project_id, 'q': q, 'sheet': sheet_name, 'per_page': per_page,
+                    'sheets': sheets})
+
+def send_circuit_svg(project_id, circuit_ids, title):
+    """Respond with the drawing of ``circuit_ids`` (ETag is the drawn rows' content hash)"""
+    svg, key = circuit_svg(project_id, circuit_ids, title,
+                           cache_seconds=current_app.config.get("CIRCUIT_SVG_CACHE_SECONDS", 300))
+    response = current_app.response_class(svg, mimetype='image/svg+xml')
+    response.set_etag(key)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@bp.route("/circuit/<circuit_id>/svg")
+def circuit_drawing(circuit_id):
+    """Drawing of one circuit of the current project, rendered from the database"""
+    project_id = request.args.get('project_id', type=int) or get_current_project()
+    if not project_id:
+        return redirect(url_for("main.project_selection"))
+    if not any(MODEL_MAP[sheet].query.filter_by(project_id=project_id, circuit_id=circuit_id).first()
+               for sheet in ('circuit', 'terminal')):
+        return f"No circuit {circuit_id} in Project ID {project_id}", 404
+    return send_circuit_svg(project_id, [circuit_id], f"Circuit {circuit_id}")
+
+@bp.route("/junction/<junction_name>/svg")
+def junction_drawing(junction_name):
+    """Drawing of a junction's circuits (only those in circuit ``row`` if given)"""
+    project_id = request.args.get('project_id', type=int) or get_current_project()
+    if not project_id:
+        return redirect(url_for("main.project_selection"))
+    row = request.args.get('row', type=int)
+    circuit_ids = circuit_ids_for(project_id, junction_name=junction_name, row=row)
+    if not circuit_ids:
+        return f"No circuits in junction {junction_name} in Project ID {project_id}", 404
+    title = junction_name if row is None else f"{junction_name} row {row}"
+    return send_circuit_svg(project_id, circuit_ids, title)
+
 @bp.route("/sheet/<name>/edit/<int:row_id>")
 def edit_row(name, row_id):
     """Redirect to sheet form with edit parameter"""
@@ -342,33 +726,28 @@ def edit_row(name, row_id):
 
 @bp.route("/preview")
 def preview():
-    """Preview all data before download"""
+    """Preview all data before download.
+    
+    Only sheet names and row counts are rendered; each sheet tab fetches
+    its rows from /api/sheet/<name>/rows as it is scrolled.
+    """
     project_id = get_current_project()
     if not project_id:
         return redirect(url_for("main.project_selection"))
     
     current_project = Project.query.get(project_id)
+    not_modified = project_not_modified(current_project, "preview")
+    if not_modified:
+        return not_modified
+    table_counts = project_stats([project_id])[project_id][0]
     
-    table_data = {}
-    total_records = 0
-    for sheet_name, model in MODEL_MAP.items():
-        records = model.query.filter_by(project_id=project_id).order_by(model.id).all()
-        # Convert to dictionaries
-        records_data = []
-        for record in records:
-            record_dict = {}
-            for col in SHEETS[sheet_name]:
-                record_dict[col] = getattr(record, col, '')
-            records_data.append(record_dict)
-        
-        table_data[sheet_name] = records_data
-        total_records += len(records_data)
-    
-    return render_template("preview.html", 
+    response = current_app.make_response(render_template("preview.html", 
                          sheets=SHEETS, 
-                         tables=table_data,
+                         counts=table_counts,
                          current_project=current_project,
-                         total_records=total_records)
+                         total_records=sum(table_counts.values()),
+                         chunk_size=PREVIEW_CHUNK_SIZE))
+    return set_project_validators(response, current_project, "preview")
 
 @bp.route("/download")
 def download():
@@ -379,49 +758,28 @@ def download():
         return redirect(url_for("main.project_selection"))
     
     current_project = Project.query.get(project_id)
+    not_modified = project_not_modified(current_project, "xlsx")
+    if not_modified:
+        return not_modified
     
-    # Create workbook
-    wb = Workbook()
-    default = wb.active
-    wb.remove(default)
-
-    total_records = 0
-    # Add each sheet with data
-    for sheet_name, columns in SHEETS.items():
-        ws = wb.create_sheet(title=sheet_name)
-        
-        # Add headers
-        ws.append(columns)
-        
-        # Add data from database
-        model = MODEL_MAP[sheet_name]
-        records = model.query.filter_by(project_id=project_id).order_by(model.id).all()
-        
-        for record in records:
-            row = []
-            for col in columns:
-                # Get attribute value, default to empty string
-                value = getattr(record, col, "")
-                row.append(str(value) if value is not None else "")
-            ws.append(row)
-            total_records += 1
-
-    # Save to memory and send
-    bio = io.BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+    # Exports are cached in the artifact store per project version; a miss
+    # builds the workbook on disk with a write-only workbook
+    xlsx_file, cached = cached_project_xlsx(current_project, current_app.config.get("EXPORT_FETCH_SIZE"))
+    total_records = sum(project_stats([project_id])[project_id][0].values())
     
     # Use IST time in filename
     filename = f"RAILWAYPROJECT_ID{project_id}_{current_project.name}_{get_ist_now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     
-    flash(f"Downloaded {total_records} records from Project ID {project_id}")
+    flash(f"Downloaded {total_records} records from Project ID {project_id}"
+          + (" (unchanged since the last export)" if cached else ""))
     
-    return send_file(
-        bio,
+    response = send_file(
+        xlsx_file,
         as_attachment=True,
         download_name=filename,
         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
+    return set_project_validators(response, current_project, "xlsx")
 
 @bp.route("/project/<int:project_id>/switch")
 def switch_project(project_id):
@@ -431,6 +789,26 @@ def switch_project(project_id):
     flash(f"Switched to Project ID {project.id}: {project.name}")
     return redirect(url_for("main.index"))
 
+@bp.route("/project/<int:project_id>/clone", methods=["POST"])
+def clone_project_route(project_id):
+    """Clone a project and all its sheet rows as a new revision"""
+    source = Project.query.get_or_404(project_id)
+    name = request.form.get('name', '').strip() or f"{source.name} (copy)"
+    
+    try:
+        start = time.perf_counter()
+        project = clone_project(source.id, name)
+        elapsed = time.perf_counter() - start
+        sheet_counts, _ = project_stats([project.id])[project.id]
+        session['project_id'] = project.id
+        flash(f"Cloned Project ID {source.id} into Project ID {project.id}: {project.name} "
+              f"({sum(sheet_counts.values())} records in {elapsed:.2f}s)")
+    except Exception as e:
+        flash(f"Error cloning project: {str(e)}")
+        return redirect(url_for("main.project_selection"))
+    
+    return redirect(url_for("main.index"))
+
 @bp.route("/new_project", methods=["GET", "POST"])
 def new_project():
     """Create new project"""
@@ -441,6 +819,9 @@ def new_project():
         if name:
             project = Project(name=name, description=description)
             db.session.add(project)
+            db.session.flush()
+            init_project_stats(project.id)
+            ensure_project_partitions(project.id)
             db.session.commit()
             session['project_id'] = project.id
             flash(f"Created new Project ID {project.id}: {project.name}")
@@ -458,13 +839,18 @@ def clear_current_project():
         return redirect(url_for("main.project_selection"))
     
     try:
+        # Partitioned tables drop the project's rows with a TRUNCATE of its
+        # partition; the maintained stats give the count without a scan
+        sheet_counts, _ = project_stats([project_id])[project_id]
+        truncated = truncate_project_partitions(project_id)
         total_deleted = 0
-        # Delete all data for current project
-        for model in MODEL_MAP.values():
-            count = model.query.filter_by(project_id=project_id).count()
-            model.query.filter_by(project_id=project_id).delete()
-            total_deleted += count
+        for sheet_name, model in MODEL_MAP.items():
+            if model.__tablename__ in truncated:
+                total_deleted += sheet_counts[sheet_name]
+            else:
+                total_deleted += model.query.filter_by(project_id=project_id).delete()
         
+        reset_row_counts(project_id)
         db.session.commit()
         flash(f"All data cleared from Project ID {project_id} (Deleted {total_deleted} records)")
     except Exception as e:
@@ -500,55 +886,91 @@ def excel_to_pdf():
             flash('Only XLSX files are allowed')
             return redirect(request.url)
         
+        filename = secure_filename(file.filename)
+        original_name = filename.replace('.xlsx', '.pdf')
+        # Per-junction PDFs are only written when asked for on the form
+        split_junctions = bool(request.form.get('split_junctions'))
+        pdf_tmp = None
+        split_dir = None
         try:
-            # Create uploads directory if it doesn't exist
-            upload_dir = os.path.join(os.getcwd(), 'uploads')
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Save uploaded file
-            filename = secure_filename(file.filename)
-            timestamp = get_ist_now().strftime('%Y%m%d_%H%M%S')
-            xlsx_filename = f"railway_project_{project_id}_{timestamp}_{filename}"
-            xlsx_path = os.path.join(upload_dir, xlsx_filename)
-            file.save(xlsx_path)
+            # Uploads are stored by content hash; the PDF is named after the
+            # workbook's hash, so converting the same workbook again is free
+            xlsx_name, xlsx_size = store_stream(file.stream, 'xlsx')
+            observe_upload("pdf_source", xlsx_size)
+            pdf_name = artifact_name(xlsx_name.rsplit('.', 1)[0], 'pdf')
+            if artifact_path(pdf_name) and (not split_junctions or junction_pdfs(pdf_name) is not None):
+                remove_artifact(xlsx_name)
+                start_thumbnails(current_app._get_current_object(), pdf_name)
+                flash(f'✅ {filename} was already converted - using the stored PDF')
+                return redirect(url_for('main.pdf_result', filename=pdf_name, original_name=original_name))
             
-            # Generate PDF filename
-            pdf_filename = xlsx_filename.replace('.xlsx', '.pdf')
-            pdf_path = os.path.join(upload_dir, pdf_filename)
+            xlsx_path = artifact_path(xlsx_name)
+            pdf_tmp = temp_path('pdf')
             
             # Run the Excel to PDF converter script
             converter_script = os.path.join(os.getcwd(), 'excel_to_pdf_converter.py')
+            command = ['python', converter_script, xlsx_path, pdf_tmp]
+            if split_junctions:
+                # The converter writes one PDF per junction in the same run
+                split_dir = tempfile.mkdtemp(prefix='junctions-')
+                command += ['--split-junctions', split_dir]
+            
+            # Every run is recorded in the conversion history
+            run_fields = dict(source_name=filename, input_hash=xlsx_name.rsplit('.', 1)[0],
+                              input_bytes=xlsx_size)
             
             # Execute the converter script
-            result = subprocess.run([
-                'python', converter_script, xlsx_path, pdf_path
-            ], capture_output=True, text=True, timeout=300)  # 5 minute timeout
+            started = time.perf_counter()
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, timeout=300)  # 5 minute timeout
+            except subprocess.TimeoutExpired as e:
+                elapsed = time.perf_counter() - started
+                observe_conversion(elapsed, "timeout")
+                record_conversion(project_id, "timeout", elapsed, converter_seconds=elapsed,
+                                  stderr_summary=output_summary(e.stderr), **run_fields)
+                raise
+            converter_seconds = time.perf_counter() - started
+            stats = parse_run_stats(result.stdout)
             
+            # Clean up XLSX file
+            remove_artifact(xlsx_name)
             if result.returncode == 0:
+                observe_conversion(converter_seconds, "success", os.path.getsize(pdf_tmp))
+                stored = time.perf_counter()
+                store_file(pdf_tmp, pdf_name)
+                pdf_tmp = None
+                if split_dir:
+                    store_junction_pdfs(pdf_name, split_dir)
+                finished = time.perf_counter()
+                record_conversion(project_id, "success", finished - started, converter_seconds, stats,
+                                  exit_code=0, pdf_name=pdf_name, store_seconds=finished - stored,
+                                  stderr_summary=output_summary(result.stderr), **run_fields)
+                # Page thumbnails for the result page are rendered in the background
+                start_thumbnails(current_app._get_current_object(), pdf_name)
                 flash(f'✅ Successfully converted {filename} to PDF!')
-                # Clean up XLSX file
-                os.remove(xlsx_path)
-                
-                return redirect(url_for('main.pdf_result', 
-                                      filename=pdf_filename, 
-                                      original_name=filename.replace('.xlsx', '.pdf')))
+                return redirect(url_for('main.pdf_result', filename=pdf_name, original_name=original_name))
             else:
-                flash(f'❌ Error converting file: {result.stderr}')
-                # Clean up files on error
-                if os.path.exists(xlsx_path):
-                    os.remove(xlsx_path)
+                observe_conversion(converter_seconds, "error")
+                # The converter reports most problems on stdout
+                message = output_summary(result.stderr or result.stdout)
+                record_conversion(project_id, "error", converter_seconds, converter_seconds, stats,
+                                  exit_code=result.returncode, stderr_summary=message, **run_fields)
+                flash(f'❌ Error converting file: {message or ""}')
                 return redirect(request.url)
                 
         except subprocess.TimeoutExpired:
             flash('❌ Conversion timed out. File might be too large.')
-            if os.path.exists(xlsx_path):
-                os.remove(xlsx_path)
+            remove_artifact(xlsx_name)
             return redirect(request.url)
         except Exception as e:
             flash(f'❌ Error processing file: {str(e)}')
-            if os.path.exists(xlsx_path):
-                os.remove(xlsx_path)
             return redirect(request.url)
+        finally:
+            # A failed conversion may leave a partial PDF behind
+            if pdf_tmp and os.path.exists(pdf_tmp):
+                os.remove(pdf_tmp)
+            if split_dir:
+                shutil.rmtree(split_dir, ignore_errors=True)
     
     # GET request - show upload form
     return render_template("excel_to_pdf.html", current_project=current_project)
@@ -563,37 +985,126 @@ def pdf_result(filename, original_name):
     current_project = Project.query.get(project_id)
     
     # Check if PDF file exists
-    upload_dir = os.path.join(os.getcwd(), 'uploads')
-    pdf_path = os.path.join(upload_dir, filename)
-    
-    if not os.path.exists(pdf_path):
+    if not filename.endswith('.pdf') or not artifact_path(filename):
         flash('PDF file not found')
         return redirect(url_for('main.excel_to_pdf'))
     
+    status, pages = thumbnail_status(current_app._get_current_object(), filename)
     return render_template("pdf_result.html", 
                          current_project=current_project,
                          filename=filename,
-                         original_name=original_name)
+                         original_name=original_name,
+                         thumbnail_status=status,
+                         thumbnails=pages or [],
+                         junctions=junction_pdfs(filename))
+
+@bp.route("/pdf_thumbnails/<filename>")
+def pdf_thumbnails(filename):
+    """JSON status of a PDF's page thumbnails, polled by the result page"""
+    if not filename.endswith('.pdf') or not artifact_path(filename, touch=False):
+        return jsonify({'error': "PDF not found"}), 404
+    status, pages = thumbnail_status(current_app._get_current_object(), filename)
+    return jsonify({'status': status,
+                    'pages': [url_for('main.pdf_thumbnail', name=name) for name in pages or []]})
+
+@bp.route("/pdf_thumbnail/<name>")
+def pdf_thumbnail(name):
+    """One page thumbnail; the name is derived from the PDF's content hash, so it never changes"""
+    path = artifact_path(name)
+    if not path or not name.endswith('.png'):
+        return "Thumbnail not found", 404
+    response = send_file(path, mimetype='image/png', max_age=365 * 24 * 3600)
+    response.cache_control.immutable = True
+    return response
 
 @bp.route("/download_pdf/<filename>")
 def download_pdf(filename):
-    """Download the generated PDF"""
-    upload_dir = os.path.join(os.getcwd(), 'uploads')
-    pdf_path = os.path.join(upload_dir, filename)
+    """Download a generated PDF from the artifact store.
+
+    Served with conditional/range support (and X-Sendfile when
+    USE_X_SENDFILE is on), so large PDFs resume and don't tie up a worker.
+    The file stays in the store until the sweeper evicts it.
+    """
+    pdf_path = artifact_path(filename) if filename.endswith('.pdf') else None
     
-    if not os.path.exists(pdf_path):
+    if not pdf_path:
         flash('PDF file not found')
         return redirect(url_for('main.excel_to_pdf'))
     
-    # Clean up file after download
-    def remove_file(response):
-        try:
-            os.remove(pdf_path)
-        except:
-            pass
-        return response
-    
+    download_name = secure_filename(request.args.get('name', '')) or filename
     return send_file(pdf_path, 
                     as_attachment=True, 
-                    download_name=filename,
-                    mimetype='application/pdf')
\ No newline at end of file
+                    download_name=download_name,
+                    mimetype='application/pdf',
+                    conditional=True,
+                    etag=filename.rsplit('.', 1)[0],  # content-addressed name
+                    max_age=3600)
+
+def pdf_junction_entries(filename):
+    """Junction entries of a generated PDF, or None if the PDF has none stored"""
+    if not filename.endswith('.pdf') or not artifact_path(filename, touch=False):
+        return None
+    return junction_pdfs(filename)
+
+@bp.route("/download_pdf/<filename>/junction/<int:index>")
+def download_junction_pdf(filename, index):
+    """Download the PDF of a single junction box (pages numbered as in the full set)"""
+    entries = pdf_junction_entries(filename) or []
+    entry = next((entry for entry in entries if entry['index'] == index), None)
+    if not entry:
+        flash('Junction PDF not found')
+        return redirect(url_for('main.excel_to_pdf'))
+    
+    original_name = secure_filename(request.args.get('name', '')) or filename
+    return send_file(artifact_path(entry['name']),
+                    as_attachment=True,
+                    download_name=junction_filename(original_name, entry),
+                    mimetype='application/pdf',
+                    conditional=True,
+                    etag=entry['name'].rsplit('.', 1)[0],
+                    max_age=3600)
+
+@bp.route("/download_pdf/<filename>/junctions.zip")
+def download_junction_zip(filename):
+    """Stream a ZIP of per-junction PDFs, built on the fly.
+
+    ``j`` (repeatable) selects junctions by index; all are included if none
+    are given.
+    """
+    entries = pdf_junction_entries(filename)
+    if entries is None:
+        flash('Junction PDFs not found')
+        return redirect(url_for('main.excel_to_pdf'))
+    
+    selected = set(request.args.getlist('j', type=int))
+    if selected:
+        entries = [entry for entry in entries if entry['index'] in selected]
+        if not entries:
+            flash('No junctions selected')
+            return redirect(request.referrer or url_for('main.excel_to_pdf'))
+    
+    original_name = secure_filename(request.args.get('name', '')) or filename
+    stem = original_name.rsplit('.', 1)[0]
+    download_name = f"{stem}_junctions.zip" if not selected else f"{stem}_{len(entries)}_junctions.zip"
+    try:
+        stream = stream_junction_zip(entries, original_name)
+    except OSError:
+        flash('Junction PDFs not found')
+        return redirect(url_for('main.excel_to_pdf'))
+    return Response(stream, mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{download_name}"'})
+
+@bp.route("/conversions")
+def conversion_dashboard():
+    """Recent PDF conversions and per-project duration percentiles"""
+    project_id = request.args.get('project_id', type=int)
+    days = request.args.get('days', DEFAULT_WINDOW_DAYS, type=int)
+    days = min(max(days, 1), 365)
+    return render_template("conversions.html",
+                         current_project=Project.query.get(get_current_project() or 0),
+                         filter_project=db.session.get(Project, project_id) if project_id else None,
+                         runs=recent_runs(project_id=project_id),
+                         trends=duration_trends(days, project_id=project_id),
+                         phases=PHASES,
+                         days=days,
+                         recent_days=RECENT_DAYS)
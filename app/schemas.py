@@ -32,6 +32,19 @@ SHEETS = {
     ]
 }
 
+# Natural key of each sheet within a project, used by upsert re-imports.
+# Rows with any empty key column cannot be matched and are always inserted.
+NATURAL_KEYS = {
+    "StationDrawing": ("station_id",),
+    "junction_box": ("junction_id",),
+    "circuit": ("circuit_id",),
+    "terminal": ("circuit_id", "terminal_id"),
+    "group": ("circuit_id", "group_id"),
+    "terminal_header": ("circuit_id", "header_type", "terminal_start"),
+    "choketable": ("circuit_id", "choke_id"),
+    "resistortable": ("circuit_id", "resistor_id"),
+}
+
 HEADER_HINTS = {
     "StationDrawing": "Enter station metadata (checksum, IDs, names, zone, totals, designations).",
     "junction_box": "Enter each junction box with coordinates and size/rows if available.",
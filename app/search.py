@@ -0,0 +1,96 @@
+import re
+from sqlalchemy import false, func, literal_column, or_
+from .models import db, MODEL_MAP
+from .schemas import SHEETS
+from .pagination import apply_filters, keyset_page, DEFAULT_PAGE_SIZE
+
+# Free-text columns searched by the ``q`` box, per sheet
+FULL_TEXT_COLUMNS = {
+    "circuit": ("circuit_name",),
+    "terminal": ("terminal_name",),
+    "group": ("text",),
+    "terminal_header": ("text",),
+    "choketable": ("terminal_name",),
+}
+
+# PostgreSQL full-text search uses the 'simple' configuration (no stemming or
+# stop words, so ids like "T12" match as typed). The expression must match
+# the GIN expression indexes created in migrations.py exactly.
+TS_CONFIG = literal_column("'simple'::regconfig")
+
+
+def ts_document(column):
+    return func.to_tsvector(TS_CONFIG, func.coalesce(column, ''))
+
+
+def search_terms(q):
+    """Split a search box value into word terms"""
+    return re.findall(r"\w+", q or "")
+
+
+def apply_prefixes(query, model, columns, prefixes):
+    """Restrict ``query`` to rows whose text columns start with the given values"""
+    for col, value in prefixes.items():
+        if col not in columns or not value:
+            continue
+        column = getattr(model, col)
+        if not isinstance(column.type, db.String):
+            column = column.cast(db.String)
+        query = query.filter(column.istartswith(value, autoescape=True))
+    return query
+
+
+def apply_full_text(query, model, sheet_name, q):
+    """Restrict ``query`` to rows whose free-text columns contain every term.
+
+    On PostgreSQL each term is a prefix match (``term:*``) against the
+    indexed tsvector; elsewhere it falls back to a case-insensitive
+    substring match.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query
+    columns = [getattr(model, col) for col in FULL_TEXT_COLUMNS.get(sheet_name, ())]
+    if not columns:
+        return query.filter(false())
+
+    if db.engine.dialect.name == 'postgresql':
+        tsquery = func.to_tsquery(TS_CONFIG, " & ".join(f"{term}:*" for term in terms))
+        return query.filter(or_(*[ts_document(column).op('@@')(tsquery) for column in columns]))
+    for term in terms:
+        query = query.filter(or_(*[column.icontains(term, autoescape=True) for column in columns]))
+    return query
+
+
+def search_sheet(sheet_name, project_id, q=None, filters=None, prefixes=None,
+                 after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    """One keyset page of a project's sheet matching the search.
+
+    ``filters`` are case-insensitive "contains" matches and ``prefixes``
+    "starts with" matches, both {column: value}; ``q`` is the free-text
+    search. Returns (rows, has_prev, has_next).
+    """
+    model = MODEL_MAP[sheet_name]
+    columns = SHEETS[sheet_name]
+    query = model.query.filter_by(project_id=project_id)
+    query = apply_filters(query, model, columns, filters or {})
+    query = apply_prefixes(query, model, columns, prefixes or {})
+    query = apply_full_text(query, model, sheet_name, q)
+    # With a text search, walking the primary key in id order until a page
+    # of matches turns up is slow when there are few or no matches; ordering
+    # on id + 0 makes the planner use the full-text index and sort instead
+    order_key = model.id + 0 if search_terms(q) else None
+    return keyset_page(query, model, after=after, before=before, per_page=per_page, order_key=order_key)
+
+
+def search_project(project_id, q, per_page=DEFAULT_PAGE_SIZE):
+    """First page of free-text matches in every searchable sheet.
+
+    Returns {sheet_name: (rows, has_next)} for sheets with at least one match.
+    """
+    results = {}
+    for sheet_name in FULL_TEXT_COLUMNS:
+        rows, _, has_next = search_sheet(sheet_name, project_id, q=q, per_page=per_page)
+        if rows:
+            results[sheet_name] = (rows, has_next)
+    return results
@@ -0,0 +1,147 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, literal, select, union_all, update
+from .models import db, Project, ProjectStats, MODEL_MAP, get_ist_now
+
+# Reverse lookup so bulk helpers can find the sheet name for a model
+SHEET_NAMES = {model: sheet_name for sheet_name, model in MODEL_MAP.items()}
+
+
+def project_row_counts(project_ids=None):
+    """Return {project_id: {sheet_name: row_count}} from a single SQL statement.
+
+    The counts are one UNION ALL of ``GROUP BY project_id`` selects across the
+    sheet tables. Pass ``project_ids`` to restrict the result; every requested
+    project is present in the result, with zero counts if it has no rows.
+    """
+    selects = []
+    for sheet_name, model in MODEL_MAP.items():
+        query = (select(model.project_id.label('project_id'),
+                        literal(sheet_name).label('sheet_name'),
+                        func.count().label('row_count'))
+                 .group_by(model.project_id))
+        if project_ids is not None:
+            query = query.where(model.project_id.in_(project_ids))
+        selects.append(query)
+
+    counts = {}
+    for project_id in project_ids or ():
+        counts[project_id] = dict.fromkeys(MODEL_MAP, 0)
+    for project_id, sheet_name, row_count in db.session.execute(union_all(*selects)):
+        counts.setdefault(project_id, dict.fromkeys(MODEL_MAP, 0))[sheet_name] = row_count
+    return counts
+
+
+def _seed_project_stats(counts):
+    """Insert project_stats rows for {project_id: {sheet_name: count}}"""
+    now = get_ist_now()
+    rows = []
+    for project_id, sheet_counts in counts.items():
+        for sheet_name, row_count in sheet_counts.items():
+            rows.append({'project_id': project_id, 'sheet_name': sheet_name,
+                         'row_count': row_count, 'last_modified': now})
+    if rows:
+        db.session.execute(ProjectStats.__table__.insert(), rows)
+
+
+def init_project_stats(project_id):
+    """Create zeroed stats rows for a new project (caller commits)"""
+    _seed_project_stats({project_id: dict.fromkeys(MODEL_MAP, 0)})
+
+
+def bump_project_version(project_id):
+    """Record that a project's sheets changed (caller commits).
+
+    Increments Project.version (and updated_date) in the caller's
+    transaction; every write path does this through adjust_row_counts or
+    reset_row_counts.
+    """
+    db.session.execute(update(Project).where(Project.id == project_id)
+                       .values(version=Project.version + 1)
+                       .execution_options(synchronize_session=False))
+
+
+def adjust_row_counts(project_id, deltas):
+    """Add ``deltas`` ({sheet_name: delta}) to the project's maintained counts.
+
+    Runs inside the caller's transaction. A delta of 0 only bumps the
+    sheet's last-modified time (used for in-place edits). Projects without
+    stats rows yet are seeded from the live tables first. Also bumps the
+    project's version.
+    """
+    bump_project_version(project_id)
+    table = ProjectStats.__table__
+    now = get_ist_now()
+    for sheet_name, delta in deltas.items():
+        result = db.session.execute(
+            table.update()
+            .where(table.c.project_id == project_id, table.c.sheet_name == sheet_name)
+            .values(row_count=table.c.row_count + delta, last_modified=now))
+        if result.rowcount == 0:
+            # Seeding reads the live tables, which already include this change
+            db.session.execute(table.delete().where(table.c.project_id == project_id))
+            _seed_project_stats(project_row_counts([project_id]))
+            return
+
+
+def reset_row_counts(project_id):
+    """Zero every maintained count of a project (used when clearing it)"""
+    bump_project_version(project_id)
+    table = ProjectStats.__table__
+    db.session.execute(table.delete().where(table.c.project_id == project_id))
+    init_project_stats(project_id)
+
+
+def copy_project_stats(source_id, target_id):
+    """Give ``target_id`` the same counts as ``source_id`` (used by cloning)"""
+    table = ProjectStats.__table__
+    db.session.execute(table.delete().where(table.c.project_id == target_id))
+    db.session.execute(table.insert().from_select(
+        ['project_id', 'sheet_name', 'row_count', 'last_modified'],
+        select(literal(target_id), table.c.sheet_name, table.c.row_count, literal(get_ist_now()))
+        .where(table.c.project_id == source_id)))
+
+
+def project_stats(project_ids):
+    """Return {project_id: (sheet_counts, last_modified)} from project_stats.
+
+    Reads the maintained summary instead of scanning the sheet tables.
+    Projects that have no summary rows yet (e.g. created before the table
+    existed) are counted once and seeded.
+    """
+    counts = {}
+    modified = {}
+    rows = db.session.execute(
+        select(ProjectStats.project_id, ProjectStats.sheet_name,
+               ProjectStats.row_count, ProjectStats.last_modified)
+        .where(ProjectStats.project_id.in_(project_ids)))
+    for project_id, sheet_name, row_count, last_modified in rows:
+        counts.setdefault(project_id, dict.fromkeys(MODEL_MAP, 0))[sheet_name] = row_count
+        if last_modified and (modified.get(project_id) is None or last_modified > modified[project_id]):
+            modified[project_id] = last_modified
+
+    missing = [project_id for project_id in project_ids if project_id not in counts]
+    if missing:
+        seeded = project_row_counts(missing)
+        _seed_project_stats(seeded)
+        db.session.commit()
+        counts.update(seeded)
+
+    return {project_id: (counts[project_id], modified.get(project_id)) for project_id in project_ids}
+
+
+def rebuild_project_stats():
+    """Recompute the whole project_stats table from the sheet tables"""
+    db.session.execute(ProjectStats.__table__.delete())
+    project_ids = db.session.execute(select(Project.id)).scalars().all()
+    _seed_project_stats(project_row_counts(project_ids))
+    db.session.commit()
+    return len(project_ids)
+
+
+@click.command("rebuild-project-stats")
+@with_appcontext
+def rebuild_project_stats_command():
+    """Rebuild the project_stats summary table from the sheet tables."""
+    count = rebuild_project_stats()
+    click.echo(f"Rebuilt project_stats for {count} projects")
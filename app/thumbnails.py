@@ -0,0 +1,146 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from .artifacts import artifact_path, derived_name, store_file, temp_path
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF before 1.24
+    except ImportError:  # Thumbnails fall back to poppler's pdftoppm, if installed
+        pymupdf = None
+
+# Low-resolution PNGs of each page of a generated PDF, stored in the
+# artifact store next to it as <pdf hash>-p<n>.png. The manifest
+# <pdf hash>-thumbs.json lists them and is written last, so its presence
+# means the set is complete.
+DEFAULT_WIDTH = 480
+
+_running = set()
+_failed = set()
+_running_lock = threading.Lock()
+
+
+def available():
+    """Whether any PDF rasterizer is installed"""
+    return pymupdf is not None or shutil.which("pdftoppm") is not None
+
+
+def manifest_name(pdf_name):
+    return derived_name(pdf_name, "thumbs", "json")
+
+
+def page_name(pdf_name, page):
+    return derived_name(pdf_name, f"p{page}", "png")
+
+
+def thumbnail_pages(pdf_name):
+    """Thumbnail names of every page, or None if they are not (all) there yet"""
+    path = artifact_path(manifest_name(pdf_name))
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            pages = json.load(f)["pages"]
+    except (OSError, ValueError, KeyError):
+        return None
+    # Pages can be evicted on their own; treat a partial set as missing
+    if not all(artifact_path(name) for name in pages):
+        return None
+    return pages
+
+
+def _render_with_pymupdf(pdf_path, width, out_dir):
+    paths = []
+    with pymupdf.open(pdf_path) as document:
+        for number, page in enumerate(document, 1):
+            zoom = width / page.rect.width
+            path = os.path.join(out_dir, f"page-{number}.png")
+            page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False).save(path)
+            paths.append(path)
+    return paths
+
+
+def _render_with_pdftoppm(pdf_path, width, out_dir):
+    subprocess.run(["pdftoppm", "-png", "-scale-to-x", str(width), "-scale-to-y", "-1",
+                    pdf_path, os.path.join(out_dir, "page")],
+                   check=True, capture_output=True, timeout=300)
+    # pdftoppm zero-pads page numbers to the width of the page count
+    return sorted(glob.glob(os.path.join(out_dir, "page-*.png")),
+                  key=lambda path: int(path.rsplit("-", 1)[1].split(".")[0]))
+
+
+def generate_thumbnails(pdf_name, width=DEFAULT_WIDTH):
+    """Render every page of stored PDF ``pdf_name`` into the artifact store.
+
+    Returns the list of thumbnail names (empty if no rasterizer is installed).
+    """
+    pdf_path = artifact_path(pdf_name)
+    if not pdf_path or not available():
+        return []
+    with tempfile.TemporaryDirectory() as out_dir:
+        if pymupdf is not None:
+            paths = _render_with_pymupdf(pdf_path, width, out_dir)
+        else:
+            paths = _render_with_pdftoppm(pdf_path, width, out_dir)
+        pages = []
+        for number, path in enumerate(paths, 1):
+            pages.append(store_file(path, page_name(pdf_name, number)))
+
+    manifest = temp_path("json")
+    with open(manifest, "w") as f:
+        json.dump({"pages": pages, "width": width}, f)
+    store_file(manifest, manifest_name(pdf_name))
+    return pages
+
+
+def start_thumbnails(app, pdf_name):
+    """Generate thumbnails for ``pdf_name`` in a background thread (once at a time per PDF).
+
+    Returns False if no rasterizer is installed, or the PDF is already being
+    rendered or failed to render before.
+    """
+    if not available():
+        return False
+    with _running_lock:
+        if pdf_name in _running or pdf_name in _failed:
+            return False
+        _running.add(pdf_name)
+
+    def run():
+        try:
+            with app.app_context():
+                if thumbnail_pages(pdf_name) is None:
+                    generate_thumbnails(pdf_name, app.config.get("THUMBNAIL_WIDTH", DEFAULT_WIDTH))
+        except Exception as e:
+            print(f"Thumbnail generation failed for {pdf_name}:", e)
+            with _running_lock:
+                _failed.add(pdf_name)
+        finally:
+            with _running_lock:
+                _running.discard(pdf_name)
+
+    threading.Thread(target=run, name=f"thumbnails-{pdf_name[:8]}", daemon=True).start()
+    return True
+
+
+def thumbnail_status(app, pdf_name):
+    """Return (status, pages) for ``pdf_name``, starting generation if needed.
+
+    status is "ready" (with the page thumbnail names), "pending",
+    "failed" or "unavailable" (no rasterizer installed).
+    """
+    pages = thumbnail_pages(pdf_name)
+    if pages is not None:
+        return "ready", pages
+    if not available():
+        return "unavailable", None
+    start_thumbnails(app, pdf_name)
+    with _running_lock:
+        failed = pdf_name in _failed
+    return ("failed" if failed else "pending"), None
@@ -10,6 +10,12 @@ from collections import OrderedDict
 import hashlib
 from datetime import datetime
 import json
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory is then not reported
+    resource = None
 
 
 def generate_checksum_and_log(df_title, excel_file_path):
@@ -565,76 +571,16 @@ def draw_group_bottom_symbol(
         ax.text(text_x, text_y, display_text, ha='center', va='top',
                 fontsize=int(17 * scale), fontweight='bold', linespacing=1.2)
 
-# === Load Excel file path from command line (or prompt) ===
-if len(sys.argv) > 1:
-    EXCEL_FILE = sys.argv[1]
-else:
-    EXCEL_FILE = input("Enter Excel file path (e.g. C:\\Diagram\\RAILWAYPROJECT.xlsx) or press Enter to exit: ").strip()
-    if not EXCEL_FILE:
-        print("No Excel file provided. Exiting.")
-        sys.exit(1)
-
-if not os.path.exists(EXCEL_FILE):
-    print(f"Error: Excel file not found at: {EXCEL_FILE}")
-    sys.exit(1)
-
-# Validate required sheets exist
-try:
-    xls = pd.ExcelFile(EXCEL_FILE)
-except Exception as e:
-    print(f"Unable to open Excel file: {e}")
-    sys.exit(1)
-
-required_sheets = ['terminal', 'junction_box', 'terminal_header', 'group', 'circuit']
-available_sheets = [s.strip() for s in xls.sheet_names]
-missing = [s for s in required_sheets if s not in available_sheets]
-if missing:
-    print(f"Excel file is missing required sheets: {missing}")
-    print(f"Available sheets: {available_sheets}")
-    sys.exit(1)
-
-# Load StationDrawing for footer if available
-df_title = None
-try:
-    df_title = pd.read_excel(EXCEL_FILE, sheet_name='StationDrawing')
-    df_title.columns = df_title.columns.str.strip()
-    print("Loaded StationDrawing sheet for footer.")
-except Exception as e:
-    print(f"Warning: Could not load StationDrawing sheet for footer: {e}. Footer will be skipped.")
-
-
-# Generate checksum and log file
-checksum, log_file = generate_checksum_and_log(df_title, EXCEL_FILE)
-if checksum:
-    print(f"Drawing generation checksum: {checksum}")
-
-# === Load Excel sheets ===
-try:
-    df = pd.read_excel(EXCEL_FILE, sheet_name='terminal')
-    df.columns = df.columns.str.strip()
-    df_junction = pd.read_excel(EXCEL_FILE, sheet_name='junction_box')
-    df_junction.columns = df_junction.columns.str.strip()
-    df_header = pd.read_excel(EXCEL_FILE, sheet_name='terminal_header')
-    df_header.columns = df_header.columns.str.strip()
-    df_group = pd.read_excel(EXCEL_FILE, sheet_name='group')
-    df_group.columns = df_group.columns.str.strip()
-    df_circuit = pd.read_excel(EXCEL_FILE, sheet_name='circuit')
-    df_circuit.columns = df_circuit.columns.str.strip()
-    df_choke = pd.read_excel(EXCEL_FILE, sheet_name='choketable')
-    df_choke.columns = df_choke.columns.str.strip()
-    df_resistor = pd.read_excel(EXCEL_FILE, sheet_name='resistortable')
-    df_resistor.columns = df_resistor.columns.str.strip()
-except Exception as e:
-    print(f"Error reading required sheets from Excel file: {e}")
-    sys.exit(1)
-finally:
-    try:
-        xls.close()
-    except Exception:
-        pass
-
-if 'spare' in df.columns:
-    df.loc[df['spare'].astype(str).str.upper() == 'Y', 'input_left'] = 'SP'
+# === Sheet data read by the drawers (installed by set_sheet_data) ===
+df = None  # terminal sheet
+df_junction = None
+df_header = None
+df_group = None
+df_circuit = None
+df_choke = None
+df_resistor = None
+df_symbols = None  # terminal rows with a drawable symbol
+global_max_width = 30.0
 
 # === STANDARDIZED DIMENSIONS ===
 SYMBOL_HEIGHT = 0.6
@@ -651,6 +597,10 @@ vertical_gap = 6.5
 footer_height = 2.75  # Adjusted footer height
 footer_inch_add = 4.0  # Reduced additional inches for footer
 
+# Fixed page size in inches
+fixed_fig_width = 42.8
+fixed_fig_height = 31.0
+
 # === Updated draw_header ===
 def draw_header(ax, circuit_id, header_type, x_start, x_end, text, min_symbol_bottom=None,
                 first_hook_x=None, last_hook_x=None, y_top_bus_group=0, y_bottom_bus_group=0, special_ha=False):
@@ -1157,12 +1107,13 @@ def parse_terminal_no_field(val):
     return s, s
 
 # === Main Draw Function ===
-def draw_symbols(df, ax, ordered_circuit_ids, junction_name, start_x=1, pin_spacing=0.8, circuits_per_page=12, page_number=1, max_terminal_symbols_per_row=36, max_rows_visible=4, page_width=None):
+def draw_symbols(df, ax, ordered_circuit_ids, junction_name, start_x=1, pin_spacing=0.8, circuits_per_page=12, page_number=1, max_terminal_symbols_per_row=36, max_rows_visible=4, page_width=None, page_frame=True):
     """
     Draw symbols for the provided ordered_circuit_ids on ax.
     max_terminal_symbols_per_row: maximum number of terminal symbols per row (default 36).
     max_rows_visible: maximum number of visible symbol rows per page (default 4).
     If drawing would start a 5th row, that row is reserved as blank and remaining circuits for the page are not drawn.
+    page_frame: set the page limits and draw the border and junction box (False draws the circuits only).
     """
     extra_rows = 0
     max_rows_for_ylim = max_rows_visible + extra_rows
@@ -1677,6 +1628,9 @@ def draw_symbols(df, ax, ordered_circuit_ids, junction_name, start_x=1, pin_spac
 
     overall_max_x = max(overall_max_x, current_row_max_x)
 
+    if not page_frame:
+        return all_x_positions, all_input_connected_flags, all_output_connected_flags
+
     # Determine content min/max from recorded positions (fallbacks provided)
     if all_x_positions:
         content_min_x = min(all_x_positions)
@@ -1879,216 +1833,205 @@ def draw_footer(ax, left, right, fixed_ylim_min, total_pages, page_num, df_title
 
 # === Prepare Plotting ===
 valid_symbols = ['capsule', 'single_fuse', 'dual_fuse', 'choke']
-df_symbols = df[df['symbol'].astype(str).str.strip().str.lower().isin(valid_symbols)].reset_index(drop=True)
 
-if 'circuit_id' not in df_symbols.columns and 'circuit_id' not in df_circuit.columns:
-    raise ValueError("Excel data must contain a 'circuit_id' column in either terminal or circuit sheets")
 
-# Keep circuit letters for internal ordering, but DO NOT use them to decide which junction comes first.
-df_circuit['circuit_letter'] = df_circuit['circuit_name'].astype(str).str.extract(r'^([A-Z])')
-df_circuit['letter_order'] = df_circuit['circuit_letter'].apply(lambda x: ord(x.upper()) - ord('A') if pd.notna(x) else -1)
+def set_sheet_data(terminal, junction_box, terminal_header, group, circuit, choketable, resistortable):
+    """Install the sheet DataFrames that draw_symbols and the other drawers read.
 
-# Get unique junction names in sheet-order (preserve first-seen order)
-junction_names = pd.unique(df_circuit['junction_name'].astype(str).str.strip())
+    Also used to draw from data that does not come from an Excel file
+    (e.g. a single circuit read from the database).
+    """
+    global df, df_junction, df_header, df_group, df_circuit, df_choke, df_resistor, df_symbols
+    df, df_junction, df_header, df_group = terminal, junction_box, terminal_header, group
+    df_circuit, df_choke, df_resistor = circuit, choketable, resistortable
 
-# Create an ordered list of circuit_ids by iterating junctions in that sheet order,
-# and ordering circuits within a junction by letter then position
-ordered_circuit_ids = []
-for junction in junction_names:
-    junction_mask = df_circuit['junction_name'].astype(str).str.strip() == junction
-    junction_circuits = df_circuit[junction_mask].copy()
-    if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
-        junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
-    elif 'position' in junction_circuits.columns:
-        junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
-    ordered_circuit_ids.extend(junction_circuits['circuit_id'].tolist())
-
-pin_spacing = 0.8
-
-# Compute max_row_width for each junction to determine page size for RAILWAYPROJECT
-# Modified to account for terminal symbols
-junction_row_widths = {}
-for junction in junction_names:
-    current_x_pre = 1
-    current_row_max_x_pre = 1
-    current_terminal_count_pre = 0
-    current_letter = None
-    max_row_width = 0
-    junction_mask = df_circuit['junction_name'].astype(str).str.strip() == junction
-    junction_circuits = df_circuit[junction_mask].copy()
-    if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
-        junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
-    elif 'position' in junction_circuits.columns:
-        junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
-    circuit_list = junction_circuits['circuit_id'].tolist()
-    for circuit_id_pre in circuit_list:
-        r = df_circuit[df_circuit['circuit_id'] == circuit_id_pre]
-        letter = r['circuit_letter'].iloc[0] if not r.empty and 'circuit_letter' in r.columns else ""
-        if letter != current_letter and current_terminal_count_pre > 0:
-            max_row_width = max(max_row_width, current_row_max_x_pre - 1)
-            current_row_max_x_pre = 1
-            current_x_pre = 1
-            current_terminal_count_pre = 0
-        current_letter = letter
-        group_pre = df_symbols[df_symbols['circuit_id'] == circuit_id_pre].sort_index().reset_index(drop=True)
-        total_terminals = 0
-        added_width = 0
-        i = 0
-        while i < len(group_pre):
-            symbol = str(group_pre.iloc[i].get('symbol', '')).strip().lower()
-            if symbol == 'dual_fuse':
-                if i + 1 < len(group_pre):
-                    added_width += pin_spacing * 1.0 + pin_spacing * 1.5
-                    total_terminals += 2
-                    i += 2
-                else:
-                    added_width += pin_spacing
-                    total_terminals += 1
-                    i += 1
-            else:
-                added_width += pin_spacing
-                total_terminals += 1
-                i += 1
-        if current_terminal_count_pre + total_terminals > 36:
-            max_row_width = max(max_row_width, current_row_max_x_pre - 1)
-            current_row_max_x_pre = 1
-            current_x_pre = 1
-            current_terminal_count_pre = 0
-        current_x_pre += added_width + CIRCUIT_GAP
-        current_row_max_x_pre = max(current_row_max_x_pre, current_x_pre)
-        current_terminal_count_pre += total_terminals
-    max_row_width = max(max_row_width, current_row_max_x_pre - 1)
-    junction_row_widths[junction] = max_row_width
-
-global_max_width = max(junction_row_widths.values()) + 2.0 if junction_row_widths else 30.0
-
-# Compute page dimensions for JB-20(F)
-jb20f_junction = 'JB-20(F)'
-max_rows_visible = 3
-max_terminal_symbols_per_row = 36
-junction_mask = df_circuit['junction_name'].astype(str).str.strip() == jb20f_junction
-junction_circuits = df_circuit[junction_mask].copy()
-if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
-    junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
-elif 'position' in junction_circuits.columns:
-    junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
-jb20f_circuit_ids = junction_circuits['circuit_id'].tolist()
-num_circuits = len(jb20f_circuit_ids)
-num_rows = max_rows_visible  # Since we split, but for height, assume max
-fixed_fig_width = 42.8
-fixed_fig_height = 31.0
+    if 'spare' in df.columns:
+        df.loc[df['spare'].astype(str).str.upper() == 'Y', 'input_left'] = 'SP'
 
-bottom_margin = 1.0
-top_margin = 3.0
-fixed_ylim_min = CAPSULE_Y_CENTER_BASE + vertical_gap * (1 - max_rows_visible) + y_bottom_bus_offset - 1.8 - bottom_margin - footer_height
-fixed_ylim_max = CAPSULE_Y_CENTER_BASE + y_top_bus_offset + 1.8 + top_margin
+    df_symbols = df[df['symbol'].astype(str).str.strip().str.lower().isin(valid_symbols)].reset_index(drop=True)
 
-# Create pages grouped by junction name, preserving the junction order from the sheet.
-pages = []
-for junction in junction_names:
-    junction_mask = df_circuit['junction_name'].astype(str).str.strip() == junction
-    junction_circuits = df_circuit[junction_mask].copy()
-    if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
-        junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
-    elif 'position' in junction_circuits.columns:
-        junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
-    circuit_list = junction_circuits['circuit_id'].tolist()
-
-    # Now, simulate drawing to split into pages
-    current_page_circuits = []
-    current_row_index = 0
-    current_terminal_count = 0
-    current_letter = None
-    for cid in circuit_list:
-        # Get letter
-        r = df_circuit[df_circuit['circuit_id'] == cid]
-        letter = r['circuit_letter'].iloc[0] if not r.empty and 'circuit_letter' in r.columns else ""
-
-        # If new letter and not at row start, would force new row
-        if letter != current_letter and current_terminal_count > 0:
-            # Would force new row
-            current_row_index += 1
-            if current_row_index >= max_rows_visible:
-                # Start new page
-                if current_page_circuits:
-                    pages.append((junction, current_page_circuits))
-                current_page_circuits = []
-                current_row_index = 0
-                current_terminal_count = 0
-            else:
-                # Continue on same page, but reset terminal count for new row
-                current_terminal_count = 0
-
-        current_letter = letter
-
-        # Compute terminals for this circuit
-        group = df_symbols[df_symbols['circuit_id'] == cid].sort_index().reset_index(drop=True)
-        total_terminals_this = 0
-        i = 0
-        while i < len(group):
-            symbol = str(group.iloc[i].get('symbol', '')).strip().lower()
-            if symbol == 'dual_fuse' and i + 1 < len(group):
-                total_terminals_this += 2
-                i += 2
-            else:
-                total_terminals_this += 1
-                i += 1
-
-        # Check if adding would exceed current row
-        if current_terminal_count + total_terminals_this > max_terminal_symbols_per_row:
-            # Would start new row
-            current_row_index += 1
-            if current_row_index >= max_rows_visible:
-                # Start new page
-                if current_page_circuits:
-                    pages.append((junction, current_page_circuits))
-                current_page_circuits = []
-                current_row_index = 0
-                current_terminal_count = 0
-            else:
-                current_terminal_count = 0
-
-        # Add the circuit to current page
-        current_page_circuits.append(cid)
-        current_terminal_count += total_terminals_this
-
-    # After all circuits in junction, add the last page if any
-    if current_page_circuits:
-        pages.append((junction, current_page_circuits))
-
-total_pages = len(pages)
-title_row = df_title.iloc[0] if df_title is not None and not df_title.empty else None
-
-# Generate PDF with fixed dimensions
-output_file = 'Terminal_Symbols_Centered_Fixed_Size.pdf'
-with PdfPages(output_file) as pdf:
-    for page_num, (junction_name, page_circuit_ids) in enumerate(pages, 1):
-        if page_num == 1 and checksum:
-            pdf.infodict()['Title'] = f'Terminal Drawing - Checksum: {checksum[:8]}'
-        # Use fixed dimensions from JB-20(F) first page
-        # per-page computation
-        page_max_width = 0
-        current_x_page = 1
-        current_row_max_x_page = 1
-        current_terminal_count_page = 0
+    if 'circuit_id' not in df_symbols.columns and 'circuit_id' not in df_circuit.columns:
+        raise ValueError("Excel data must contain a 'circuit_id' column in either terminal or circuit sheets")
+
+    # Keep circuit letters for internal ordering, but DO NOT use them to decide which junction comes first.
+    df_circuit['circuit_letter'] = df_circuit['circuit_name'].astype(str).str.extract(r'^([A-Z])')
+    df_circuit['letter_order'] = df_circuit['circuit_letter'].apply(lambda x: ord(x.upper()) - ord('A') if pd.notna(x) else -1)
+
+
+def peak_memory_kb():
+    """Peak resident memory of this process in KiB, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, KiB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def print_run_stats(phases, total_pages, junction_count, checksum=None):
+    """Print a machine-readable summary line (read back by the web app's run history)"""
+    stats = {'phases': {name: round(seconds, 3) for name, seconds in phases.items()},
+             'pages': total_pages, 'junctions': junction_count,
+             'peak_memory_kb': peak_memory_kb(), 'checksum': checksum}
+    print(f"CONVERSION STATS: {json.dumps(stats)}")
+
+
+def write_junction_pdf(split_dir, junction_files, junction_name, first_page, checksum=None):
+    """Open the split-output PDF of one junction and record it in ``junction_files``.
+
+    Files are numbered in page order (001.pdf, 002.pdf, ...); junction names
+    are kept in junctions.json rather than in file names. The pages keep
+    their numbering from the full drawing set.
+    """
+    file_name = f"{len(junction_files) + 1:03d}.pdf"
+    junction_files.append({'junction': junction_name, 'file': file_name,
+                           'first_page': first_page, 'pages': 0})
+    junction_pdf = PdfPages(os.path.join(split_dir, file_name))
+    title = f'Terminal Drawing - {junction_name}'
+    junction_pdf.infodict()['Title'] = f'{title} - Checksum: {checksum[:8]}' if checksum else title
+    return junction_pdf
+
+
+def main(argv=None):
+    """Convert an Excel workbook to the terminal drawing PDF.
+
+    ``argv`` is [excel_file, output_pdf] (both optional; defaults to sys.argv[1:]),
+    optionally followed by ``--split-junctions DIR`` to also write one PDF per
+    junction into DIR (see write_junction_pdf).
+    """
+    global global_max_width
+    started = time.perf_counter()
+    argv = list(sys.argv[1:] if argv is None else argv)
+    split_dir = None
+    if '--split-junctions' in argv:
+        flag = argv.index('--split-junctions')
+        if flag + 1 >= len(argv):
+            print("--split-junctions needs an output directory")
+            sys.exit(1)
+        split_dir = argv[flag + 1]
+        del argv[flag:flag + 2]
+        os.makedirs(split_dir, exist_ok=True)
+
+    # === Load Excel file path from command line (or prompt) ===
+    if argv:
+        EXCEL_FILE = argv[0]
+    else:
+        EXCEL_FILE = input("Enter Excel file path (e.g. C:\\Diagram\\RAILWAYPROJECT.xlsx) or press Enter to exit: ").strip()
+        if not EXCEL_FILE:
+            print("No Excel file provided. Exiting.")
+            sys.exit(1)
+
+    if not os.path.exists(EXCEL_FILE):
+        print(f"Error: Excel file not found at: {EXCEL_FILE}")
+        sys.exit(1)
+
+    # Validate required sheets exist
+    try:
+        xls = pd.ExcelFile(EXCEL_FILE)
+    except Exception as e:
+        print(f"Unable to open Excel file: {e}")
+        sys.exit(1)
+
+    required_sheets = ['terminal', 'junction_box', 'terminal_header', 'group', 'circuit']
+    available_sheets = [s.strip() for s in xls.sheet_names]
+    missing = [s for s in required_sheets if s not in available_sheets]
+    if missing:
+        print(f"Excel file is missing required sheets: {missing}")
+        print(f"Available sheets: {available_sheets}")
+        sys.exit(1)
+
+    # Load StationDrawing for footer if available
+    df_title = None
+    try:
+        df_title = pd.read_excel(EXCEL_FILE, sheet_name='StationDrawing')
+        df_title.columns = df_title.columns.str.strip()
+        print("Loaded StationDrawing sheet for footer.")
+    except Exception as e:
+        print(f"Warning: Could not load StationDrawing sheet for footer: {e}. Footer will be skipped.")
+
+
+    # Generate checksum and log file
+    checksum, log_file = generate_checksum_and_log(df_title, EXCEL_FILE)
+    if checksum:
+        print(f"Drawing generation checksum: {checksum}")
+
+    # === Load Excel sheets ===
+    try:
+        df_terminal = pd.read_excel(EXCEL_FILE, sheet_name='terminal')
+        df_terminal.columns = df_terminal.columns.str.strip()
+        df_junction = pd.read_excel(EXCEL_FILE, sheet_name='junction_box')
+        df_junction.columns = df_junction.columns.str.strip()
+        df_header = pd.read_excel(EXCEL_FILE, sheet_name='terminal_header')
+        df_header.columns = df_header.columns.str.strip()
+        df_group = pd.read_excel(EXCEL_FILE, sheet_name='group')
+        df_group.columns = df_group.columns.str.strip()
+        df_circuit = pd.read_excel(EXCEL_FILE, sheet_name='circuit')
+        df_circuit.columns = df_circuit.columns.str.strip()
+        df_choke = pd.read_excel(EXCEL_FILE, sheet_name='choketable')
+        df_choke.columns = df_choke.columns.str.strip()
+        df_resistor = pd.read_excel(EXCEL_FILE, sheet_name='resistortable')
+        df_resistor.columns = df_resistor.columns.str.strip()
+    except Exception as e:
+        print(f"Error reading required sheets from Excel file: {e}")
+        sys.exit(1)
+    finally:
+        try:
+            xls.close()
+        except Exception:
+            pass
+
+    set_sheet_data(df_terminal, df_junction, df_header, df_group, df_circuit, df_choke, df_resistor)
+    phases = {'load': time.perf_counter() - started}
+
+    # Get unique junction names in sheet-order (preserve first-seen order)
+    junction_names = pd.unique(df_circuit['junction_name'].astype(str).str.strip())
+
+    # Create an ordered list of circuit_ids by iterating junctions in that sheet order,
+    # and ordering circuits within a junction by letter then position
+    ordered_circuit_ids = []
+    for junction in junction_names:
+        junction_mask = df_circuit['junction_name'].astype(str).str.strip() == junction
+        junction_circuits = df_circuit[junction_mask].copy()
+        if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
+            junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
+        elif 'position' in junction_circuits.columns:
+            junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
+        ordered_circuit_ids.extend(junction_circuits['circuit_id'].tolist())
+
+    pin_spacing = 0.8
+
+    # Compute max_row_width for each junction to determine page size for RAILWAYPROJECT
+    # Modified to account for terminal symbols
+    junction_row_widths = {}
+    for junction in junction_names:
+        current_x_pre = 1
+        current_row_max_x_pre = 1
+        current_terminal_count_pre = 0
         current_letter = None
-        for cid in page_circuit_ids:
-            r = df_circuit[df_circuit['circuit_id'] == cid]
+        max_row_width = 0
+        junction_mask = df_circuit['junction_name'].astype(str).str.strip() == junction
+        junction_circuits = df_circuit[junction_mask].copy()
+        if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
+            junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
+        elif 'position' in junction_circuits.columns:
+            junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
+        circuit_list = junction_circuits['circuit_id'].tolist()
+        for circuit_id_pre in circuit_list:
+            r = df_circuit[df_circuit['circuit_id'] == circuit_id_pre]
             letter = r['circuit_letter'].iloc[0] if not r.empty and 'circuit_letter' in r.columns else ""
-            if letter != current_letter and current_terminal_count_page > 0:
-                page_max_width = max(page_max_width, current_row_max_x_page - 1)
-                current_row_max_x_page = 1
-                current_x_page = 1
-                current_terminal_count_page = 0
+            if letter != current_letter and current_terminal_count_pre > 0:
+                max_row_width = max(max_row_width, current_row_max_x_pre - 1)
+                current_row_max_x_pre = 1
+                current_x_pre = 1
+                current_terminal_count_pre = 0
             current_letter = letter
-            group = df_symbols[df_symbols['circuit_id'] == cid].sort_index().reset_index(drop=True)
+            group_pre = df_symbols[df_symbols['circuit_id'] == circuit_id_pre].sort_index().reset_index(drop=True)
             total_terminals = 0
             added_width = 0
             i = 0
-            while i < len(group):
-                symbol = str(group.iloc[i].get('symbol', '')).strip().lower()
+            while i < len(group_pre):
+                symbol = str(group_pre.iloc[i].get('symbol', '')).strip().lower()
                 if symbol == 'dual_fuse':
-                    if i + 1 < len(group):
+                    if i + 1 < len(group_pre):
                         added_width += pin_spacing * 1.0 + pin_spacing * 1.5
                         total_terminals += 2
                         i += 2
@@ -2100,39 +2043,212 @@ with PdfPages(output_file) as pdf:
                     added_width += pin_spacing
                     total_terminals += 1
                     i += 1
-            if current_terminal_count_page + total_terminals > 36:
-                page_max_width = max(page_max_width, current_row_max_x_page - 1)
-                current_row_max_x_page = 1
-                current_x_page = 1
-                current_terminal_count_page = 0
-            current_x_page += added_width + CIRCUIT_GAP
-            current_row_max_x_page = max(current_row_max_x_page, current_x_page)
-            current_terminal_count_page += total_terminals
-        page_max_width = max(page_max_width, current_row_max_x_page - 1)
-        shift = (global_max_width - (page_max_width + 1.2)) / 2
-        page_start_x = 1 + shift
-        fig, ax = plt.subplots(figsize=(fixed_fig_width, fixed_fig_height))
-        ax.set_facecolor('white')
-        ax.axis('off')
-
-        x_positions, input_connected_flags, output_connected_flags = draw_symbols(
-            df_symbols, ax, page_circuit_ids, junction_name,
-            start_x=page_start_x, pin_spacing=pin_spacing,
-            circuits_per_page=len(page_circuit_ids),
-            page_number=page_num,
-            max_terminal_symbols_per_row=36,
-            max_rows_visible=3,  # enforce 3 visible rows; 4th row will be blank if triggered
-            page_width=global_max_width
-        )
+            if current_terminal_count_pre + total_terminals > 36:
+                max_row_width = max(max_row_width, current_row_max_x_pre - 1)
+                current_row_max_x_pre = 1
+                current_x_pre = 1
+                current_terminal_count_pre = 0
+            current_x_pre += added_width + CIRCUIT_GAP
+            current_row_max_x_pre = max(current_row_max_x_pre, current_x_pre)
+            current_terminal_count_pre += total_terminals
+        max_row_width = max(max_row_width, current_row_max_x_pre - 1)
+        junction_row_widths[junction] = max_row_width
+
+    global_max_width = max(junction_row_widths.values()) + 2.0 if junction_row_widths else 30.0
+
+    # Compute page dimensions for JB-20(F)
+    jb20f_junction = 'JB-20(F)'
+    max_rows_visible = 3
+    max_terminal_symbols_per_row = 36
+    junction_mask = df_circuit['junction_name'].astype(str).str.strip() == jb20f_junction
+    junction_circuits = df_circuit[junction_mask].copy()
+    if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
+        junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
+    elif 'position' in junction_circuits.columns:
+        junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
+    jb20f_circuit_ids = junction_circuits['circuit_id'].tolist()
+    num_circuits = len(jb20f_circuit_ids)
+    num_rows = max_rows_visible  # Since we split, but for height, assume max
 
-        # Draw footer on bottom right half
-        left = page_start_x - 1.5  # From draw_symbols logic
-        right = left + global_max_width
-        draw_footer(ax, left, right, fixed_ylim_min, total_pages, page_num, title_row, junction_name)
+    bottom_margin = 1.0
+    top_margin = 3.0
+    fixed_ylim_min = CAPSULE_Y_CENTER_BASE + vertical_gap * (1 - max_rows_visible) + y_bottom_bus_offset - 1.8 - bottom_margin - footer_height
+    fixed_ylim_max = CAPSULE_Y_CENTER_BASE + y_top_bus_offset + 1.8 + top_margin
 
-        fig.subplots_adjust(left=0.04, right=0.99, top=0.98, bottom=0.02)
-        pdf.savefig(fig, dpi=300, facecolor='white')
-        plt.close(fig)
-        print(f"Page {page_num} (Junction: {junction_name}) added to '{output_file}' with fixed size ({fixed_fig_width}, {fixed_fig_height})")
+    # Create pages grouped by junction name, preserving the junction order from the sheet.
+    pages = []
+    for junction in junction_names:
+        junction_mask = df_circuit['junction_name'].astype(str).str.strip() == junction
+        junction_circuits = df_circuit[junction_mask].copy()
+        if 'letter_order' in junction_circuits.columns and 'position' in junction_circuits.columns:
+            junction_circuits = junction_circuits.sort_values(['letter_order', 'position'], na_position='last')
+        elif 'position' in junction_circuits.columns:
+            junction_circuits = junction_circuits.sort_values(['position'], na_position='last')
+        circuit_list = junction_circuits['circuit_id'].tolist()
+
+        # Now, simulate drawing to split into pages
+        current_page_circuits = []
+        current_row_index = 0
+        current_terminal_count = 0
+        current_letter = None
+        for cid in circuit_list:
+            # Get letter
+            r = df_circuit[df_circuit['circuit_id'] == cid]
+            letter = r['circuit_letter'].iloc[0] if not r.empty and 'circuit_letter' in r.columns else ""
 
-print(f"Multi-page PDF saved as '{output_file}'")
\ No newline at end of file
+            # If new letter and not at row start, would force new row
+            if letter != current_letter and current_terminal_count > 0:
+                # Would force new row
+                current_row_index += 1
+                if current_row_index >= max_rows_visible:
+                    # Start new page
+                    if current_page_circuits:
+                        pages.append((junction, current_page_circuits))
+                    current_page_circuits = []
+                    current_row_index = 0
+                    current_terminal_count = 0
+                else:
+                    # Continue on same page, but reset terminal count for new row
+                    current_terminal_count = 0
+
+            current_letter = letter
+
+            # Compute terminals for this circuit
+            group = df_symbols[df_symbols['circuit_id'] == cid].sort_index().reset_index(drop=True)
+            total_terminals_this = 0
+            i = 0
+            while i < len(group):
+                symbol = str(group.iloc[i].get('symbol', '')).strip().lower()
+                if symbol == 'dual_fuse' and i + 1 < len(group):
+                    total_terminals_this += 2
+                    i += 2
+                else:
+                    total_terminals_this += 1
+                    i += 1
+
+            # Check if adding would exceed current row
+            if current_terminal_count + total_terminals_this > max_terminal_symbols_per_row:
+                # Would start new row
+                current_row_index += 1
+                if current_row_index >= max_rows_visible:
+                    # Start new page
+                    if current_page_circuits:
+                        pages.append((junction, current_page_circuits))
+                    current_page_circuits = []
+                    current_row_index = 0
+                    current_terminal_count = 0
+                else:
+                    current_terminal_count = 0
+
+            # Add the circuit to current page
+            current_page_circuits.append(cid)
+            current_terminal_count += total_terminals_this
+
+        # After all circuits in junction, add the last page if any
+        if current_page_circuits:
+            pages.append((junction, current_page_circuits))
+
+    total_pages = len(pages)
+    phases['layout'] = time.perf_counter() - started - phases['load']
+    title_row = df_title.iloc[0] if df_title is not None and not df_title.empty else None
+
+    # Generate PDF with fixed dimensions (output path from the command line if given)
+    output_file = argv[1] if len(argv) > 1 else 'Terminal_Symbols_Centered_Fixed_Size.pdf'
+    junction_pdf = None
+    junction_files = []
+    with PdfPages(output_file) as pdf:
+        for page_num, (junction_name, page_circuit_ids) in enumerate(pages, 1):
+            if page_num == 1 and checksum:
+                pdf.infodict()['Title'] = f'Terminal Drawing - Checksum: {checksum[:8]}'
+            # Pages are grouped by junction, so a new junction starts a new split file
+            if split_dir and (not junction_files or junction_files[-1]['junction'] != junction_name):
+                if junction_pdf is not None:
+                    junction_pdf.close()
+                junction_pdf = write_junction_pdf(split_dir, junction_files, junction_name, page_num, checksum)
+            # Use fixed dimensions from JB-20(F) first page
+            # per-page computation
+            page_max_width = 0
+            current_x_page = 1
+            current_row_max_x_page = 1
+            current_terminal_count_page = 0
+            current_letter = None
+            for cid in page_circuit_ids:
+                r = df_circuit[df_circuit['circuit_id'] == cid]
+                letter = r['circuit_letter'].iloc[0] if not r.empty and 'circuit_letter' in r.columns else ""
+                if letter != current_letter and current_terminal_count_page > 0:
+                    page_max_width = max(page_max_width, current_row_max_x_page - 1)
+                    current_row_max_x_page = 1
+                    current_x_page = 1
+                    current_terminal_count_page = 0
+                current_letter = letter
+                group = df_symbols[df_symbols['circuit_id'] == cid].sort_index().reset_index(drop=True)
+                total_terminals = 0
+                added_width = 0
+                i = 0
+                while i < len(group):
+                    symbol = str(group.iloc[i].get('symbol', '')).strip().lower()
+                    if symbol == 'dual_fuse':
+                        if i + 1 < len(group):
+                            added_width += pin_spacing * 1.0 + pin_spacing * 1.5
+                            total_terminals += 2
+                            i += 2
+                        else:
+                            added_width += pin_spacing
+                            total_terminals += 1
+                            i += 1
+                    else:
+                        added_width += pin_spacing
+                        total_terminals += 1
+                        i += 1
+                if current_terminal_count_page + total_terminals > 36:
+                    page_max_width = max(page_max_width, current_row_max_x_page - 1)
+                    current_row_max_x_page = 1
+                    current_x_page = 1
+                    current_terminal_count_page = 0
+                current_x_page += added_width + CIRCUIT_GAP
+                current_row_max_x_page = max(current_row_max_x_page, current_x_page)
+                current_terminal_count_page += total_terminals
+            page_max_width = max(page_max_width, current_row_max_x_page - 1)
+            shift = (global_max_width - (page_max_width + 1.2)) / 2
+            page_start_x = 1 + shift
+            fig, ax = plt.subplots(figsize=(fixed_fig_width, fixed_fig_height))
+            ax.set_facecolor('white')
+            ax.axis('off')
+
+            x_positions, input_connected_flags, output_connected_flags = draw_symbols(
+                df_symbols, ax, page_circuit_ids, junction_name,
+                start_x=page_start_x, pin_spacing=pin_spacing,
+                circuits_per_page=len(page_circuit_ids),
+                page_number=page_num,
+                max_terminal_symbols_per_row=36,
+                max_rows_visible=3,  # enforce 3 visible rows; 4th row will be blank if triggered
+                page_width=global_max_width
+            )
+
+            # Draw footer on bottom right half
+            left = page_start_x - 1.5  # From draw_symbols logic
+            right = left + global_max_width
+            draw_footer(ax, left, right, fixed_ylim_min, total_pages, page_num, title_row, junction_name)
+
+            fig.subplots_adjust(left=0.04, right=0.99, top=0.98, bottom=0.02)
+            pdf.savefig(fig, dpi=300, facecolor='white')
+            if junction_pdf is not None:
+                junction_pdf.savefig(fig, dpi=300, facecolor='white')
+                junction_files[-1]['pages'] += 1
+            plt.close(fig)
+            print(f"Page {page_num} (Junction: {junction_name}) added to '{output_file}' with fixed size ({fixed_fig_width}, {fixed_fig_height})")
+
+    print(f"Multi-page PDF saved as '{output_file}'")
+    phases['render'] = time.perf_counter() - started - phases['load'] - phases['layout']
+    if junction_pdf is not None:
+        junction_pdf.close()
+    if split_dir:
+        # Written last: its presence means every junction file is complete
+        with open(os.path.join(split_dir, 'junctions.json'), 'w') as f:
+            json.dump({'total_pages': total_pages, 'junctions': junction_files}, f, indent=2)
+        print(f"{len(junction_files)} junction PDFs saved in '{split_dir}'")
+    print_run_stats(phases, total_pages, len(junction_files), checksum)
+
+
+if __name__ == '__main__':
+    main()
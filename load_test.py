@@ -0,0 +1,327 @@
+"""Load-testing harness for the Railway XLSX Builder.
+
+Two subcommands, both running entirely locally:
+
+  python load_test.py seed --projects 20 --terminals 5000
+      Creates synthetic projects (named "loadtest-<n>") through the app's
+      models. The database comes from DATABASE_URL, e.g.
+      DATABASE_URL=sqlite:///loadtest.db or postgresql://...
+
+  python load_test.py run --users 8 --duration 60
+      Drives concurrent simulated users through the main pages and reports
+      throughput and p50/p95/p99 latency per route. By default requests go
+      to an in-process app (same DATABASE_URL); pass --url to load a
+      running server instead.
+"""
+import argparse
+import http.cookiejar
+import io
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+
+from openpyxl import Workbook
+
+SYMBOLS = ["capsule", "capsule", "capsule", "single_fuse", "choke"]
+TERMINALS_PER_CIRCUIT = 8
+CIRCUITS_PER_JUNCTION = 12
+
+# Route name -> relative weight of each simulated user action
+DEFAULT_WEIGHTS = {
+    "project_selection": 10,
+    "index": 20,
+    "sheet_form": 40,
+    "preview": 5,
+    "upload_sheet": 5,
+    "download": 5,
+    "excel_to_pdf": 1,
+}
+
+
+# === Seeding ===
+
+def synthetic_sheets(terminals, seed=0):
+    """Return {sheet_name: [row tuple, ...]} for one synthetic project"""
+    rng = random.Random(seed)
+    circuits = max(1, terminals // TERMINALS_PER_CIRCUIT)
+    junctions = max(1, -(-circuits // CIRCUITS_PER_JUNCTION))
+    sheets = defaultdict(list)
+
+    sheets["StationDrawing"].append((
+        None, f"ST{seed}", "Terminal Diagram", f"Station {seed}", f"S{seed:03d}", "1", "2025-01-01",
+        "Load Test", "Load Test", "Division", "Zone", str(junctions), "SSE", "ASTE", "DSTE"))
+    for j in range(junctions):
+        sheets["junction_box"].append((
+            f"ST{seed}", f"J{j}", f"JB-{j + 1}(F)", 12.9 + rng.random(), 77.5 + rng.random(), 36, "1"))
+
+    terminal_no = 0
+    for c in range(circuits):
+        circuit_id = f"C{c}"
+        junction = c // CIRCUITS_PER_JUNCTION
+        letter = "ABCDEFGH"[(c % CIRCUITS_PER_JUNCTION) // 3]
+        sheets["circuit"].append((
+            circuit_id, f"{letter}{c}TPR", f"J{junction}", f"JB-{junction + 1}(F)",
+            (c % CIRCUITS_PER_JUNCTION) // 4 + 1, c % CIRCUITS_PER_JUNCTION + 1, "T", terminal_no + 1))
+        count = min(TERMINALS_PER_CIRCUIT, terminals - terminal_no) if c == circuits - 1 else TERMINALS_PER_CIRCUIT
+        for t in range(max(count, 1)):
+            terminal_no += 1
+            sheets["terminal"].append((
+                circuit_id, str(t + 1), f"T{terminal_no}", rng.choice(SYMBOLS),
+                f"IN{t}", f"R{t}", rng.random() < 0.05, rng.random() < 0.8, rng.random() < 0.8,
+                f"OUT{t}", f"L{t}"))
+        sheets["terminal_header"].append((circuit_id, "top", 1, max(count, 1), "input", f"{letter}{c} RELAY"))
+        sheets["group"].append((circuit_id, "G1", "1-2", "input", "COMMON"))
+        if c % 5 == 0:
+            sheets["choketable"].append((circuit_id, f"CH{c}", "1", "2", f"CHOKE {c}"))
+        if c % 7 == 0:
+            sheets["resistortable"].append((circuit_id, f"R{c}", "1", "2", f"R{c}"))
+    return sheets
+
+
+def seed(args):
+    from app import create_app
+    from app.models import db, Project, MODEL_MAP
+    from app.schemas import SHEETS
+    from app.stats import init_project_stats
+    from app.partitioning import ensure_project_partitions
+    from app.importer import bulk_insert
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        total = 0
+        for n in range(args.projects):
+            project = Project(name=f"loadtest-{n}", description=f"Synthetic project with {args.terminals} terminals")
+            db.session.add(project)
+            db.session.flush()
+            init_project_stats(project.id)
+            ensure_project_partitions(project.id)
+            db.session.commit()
+            for sheet_name, rows in synthetic_sheets(args.terminals, seed=n).items():
+                total += bulk_insert(MODEL_MAP[sheet_name], SHEETS[sheet_name], project.id, rows)
+            print(f"Seeded project {project.id} ({project.name})")
+        elapsed = time.perf_counter() - started
+        print(f"Seeded {args.projects} projects, {total} rows in {elapsed:.1f}s")
+
+
+# === Clients ===
+
+class InProcessClient:
+    """Flask test client with the same get/post interface as HttpClient"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data()
+
+    def post(self, path, fields=None, files=None):
+        data = dict(fields or {})
+        for name, (filename, content) in (files or {}).items():
+            data[name] = (io.BytesIO(content), filename)
+        response = self.client.post(path, data=data, content_type="multipart/form-data")
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """Minimal urllib client with a cookie jar (one per simulated user)"""
+
+    def __init__(self, base_url, timeout=600):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, fields=None, files=None):
+        boundary = uuid.uuid4().hex
+        body = io.BytesIO()
+        for name, value in (fields or {}).items():
+            body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for name, (filename, content) in (files or {}).items():
+            body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                       f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+            body.write(content)
+            body.write(b"\r\n")
+        body.write(f"--{boundary}--\r\n".encode())
+        request = urllib.request.Request(self.base_url + path, data=body.getvalue(), method="POST",
+                                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        return self._open(request)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time each request on its own, like the test client does
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# === Simulated users ===
+
+def upload_workbook_bytes(rows=50):
+    """A small terminal sheet; uploaded in upsert mode so repeats don't grow the project"""
+    from app.schemas import SHEETS
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "terminal"
+    ws.append(SHEETS["terminal"])
+    for t in range(rows):
+        ws.append(["C0", str(t + 1), f"T{t + 1}", "capsule", f"IN{t}", f"R{t}", "N", "Y", "Y", f"OUT{t}", f"L{t}"])
+    data = io.BytesIO()
+    wb.save(data)
+    return data.getvalue()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+
+def user_loop(client, project_ids, weights, deadline, stats, upload_bytes, rng):
+    routes = list(weights)
+    route_weights = [weights[route] for route in routes]
+    from app.schemas import SHEETS
+    sheet_names = list(SHEETS)
+    pdf_source = None
+
+    client.get(f"/project/{rng.choice(project_ids)}/switch")
+    while time.time() < deadline:
+        route = rng.choices(routes, route_weights)[0]
+        started = time.perf_counter()
+        if route == "project_selection":
+            status, _ = client.get("/project_selection")
+        elif route == "index":
+            status, _ = client.get("/")
+        elif route == "sheet_form":
+            status, _ = client.get(f"/sheet/{rng.choice(sheet_names)}")
+        elif route == "preview":
+            status, _ = client.get("/preview")
+        elif route == "upload_sheet":
+            status, _ = client.post("/upload/terminal", fields={"mode": "upsert"},
+                                    files={"file": ("loadtest.xlsx", upload_bytes)})
+        elif route == "download":
+            status, body = client.get("/download")
+            if status == 200:
+                pdf_source = body
+        else:
+            if pdf_source is None:
+                status, pdf_source = client.get("/download")
+            status, _ = client.post("/excel_to_pdf", files={"file": ("loadtest.xlsx", pdf_source)})
+        stats.record(route, time.perf_counter() - started, status < 400)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def report(stats, elapsed):
+    print(f"\n{'route':<20}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'max ms':>10}")
+    total = 0
+    for route in sorted(stats.latencies):
+        values = sorted(stats.latencies[route])
+        total += len(values)
+        print(f"{route:<20}{len(values):>10}{stats.errors[route]:>8}{len(values) / elapsed:>9.1f}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}{values[-1] * 1000:>10.1f}")
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+
+def run(args):
+    weights = dict(DEFAULT_WEIGHTS)
+    for route in args.skip or ():
+        weights.pop(route, None)
+    for spec in args.weight or ():
+        route, _, value = spec.partition("=")
+        if route not in DEFAULT_WEIGHTS:
+            sys.exit(f"Unknown route {route!r}; choose from {', '.join(DEFAULT_WEIGHTS)}")
+        weights[route] = float(value)
+    weights = {route: weight for route, weight in weights.items() if weight > 0}
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        from app import create_app
+        app = create_app()
+
+        def make_client():
+            return InProcessClient(app)
+
+    # Projects are discovered from the project list, like a user would
+    status, body = make_client().get("/project_selection")
+    project_ids = args.project or sorted({int(pid) for pid in re.findall(rb"/project/(\d+)/switch", body)})
+    if status != 200 or not project_ids:
+        sys.exit("No projects found; run 'python load_test.py seed' first")
+
+    stats = Stats()
+    upload_bytes = upload_workbook_bytes()
+    deadline = time.time() + args.duration
+    threads = [threading.Thread(target=user_loop, daemon=True,
+                                args=(make_client(), project_ids, weights, deadline, stats, upload_bytes,
+                                      random.Random(n)))
+               for n in range(args.users)]
+    print(f"Running {args.users} users for {args.duration}s against "
+          f"{args.url or 'an in-process app'} ({len(project_ids)} projects)")
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report(stats, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="create synthetic projects")
+    seed_parser.add_argument("--projects", type=int, default=10)
+    seed_parser.add_argument("--terminals", type=int, default=2000, help="terminal rows per project")
+    seed_parser.set_defaults(func=seed)
+
+    run_parser = commands.add_parser("run", help="drive simulated users and report latency")
+    run_parser.add_argument("--users", type=int, default=4)
+    run_parser.add_argument("--duration", type=float, default=30, help="seconds")
+    run_parser.add_argument("--url", help="base URL of a running server (default: in-process app)")
+    run_parser.add_argument("--project", type=int, action="append", help="project id to use (repeatable)")
+    run_parser.add_argument("--skip", action="append", choices=list(DEFAULT_WEIGHTS),
+                            help="route to leave out (repeatable), e.g. --skip excel_to_pdf")
+    run_parser.add_argument("--weight", action="append", metavar="ROUTE=N",
+                            help="override a route's relative weight (repeatable)")
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()